@@ -1,26 +1,46 @@
 import os
 import uvicorn
 from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Request, Depends, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse, HTMLResponse, StreamingResponse
 import asyncio
+import anyio.to_thread
+from contextlib import asynccontextmanager
 from typing import AsyncGenerator
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from pathlib import Path
 from typing import List, Dict, Any, Optional, Union
 import shutil
-import json
+import orjson
 from pydantic import BaseModel
 
 from config import settings
 from src.rag_system import RAGSystem
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Set up per-worker concurrency limits on startup and persist caches on shutdown."""
+    # Size the threadpool that runs sync endpoints and offloaded work
+    limiter = anyio.to_thread.current_default_thread_limiter()
+    limiter.total_tokens = settings.THREADPOOL_SIZE
+    
+    # Cap concurrent LLM generations so queued requests wait instead of thrashing Ollama
+    app.state.gen_sem = asyncio.Semaphore(settings.LLM_MAX_CONCURRENCY)
+    app.state.gen_waiting = 0
+    
+    yield
+    
+    # Persist caches so they are warm after a restart or reload
+    rag_system.save_caches()
+
 # Initialize FastAPI app
 app = FastAPI(
     title="RAG-Powered Q&A System",
     description="A local RAG system for question answering using company documents",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Set up templates and static files
@@ -43,6 +63,19 @@ rag_system = RAGSystem()
 # Ensure documents directory exists
 os.makedirs(settings.DOCUMENTS_DIR, exist_ok=True)
 
+@asynccontextmanager
+async def generation_slot():
+    """Hold one of the LLM generation slots, tracking how many requests are queued."""
+    app.state.gen_waiting += 1
+    try:
+        await app.state.gen_sem.acquire()
+    finally:
+        app.state.gen_waiting -= 1
+    try:
+        yield
+    finally:
+        app.state.gen_sem.release()
+
 @app.get("/", response_class=HTMLResponse)
 async def root(request: Request):
     """Serve the main HTML interface."""
@@ -50,22 +83,39 @@ async def root(request: Request):
 
 
 @app.get("/health")
-async def health():
+async def health() -> Dict[str, Any]:
     """Health endpoint with basic info about the API."""
     return {
         "name": "RAG-Powered Q&A System",
         "version": "1.0.0",
         "status": "running",
         "model": settings.LLM_MODEL,
-        "documents_dir": str(settings.DOCUMENTS_DIR)
+        "documents_dir": str(settings.DOCUMENTS_DIR),
+        "llm_max_concurrency": settings.LLM_MAX_CONCURRENCY,
+        "llm_queue_depth": app.state.gen_waiting
     }
 
 class IngestResponse(BaseModel):
     status: str
     message: str
     documents_processed: int = 0
+    chunks_processed: int = 0
+    chunks_skipped: int = 0
+    total_vectors: int = 0
     error: Optional[str] = None
 
+def _list_ingest_files() -> List[Path]:
+    """List supported files in the documents directory with a single scan."""
+    try:
+        with os.scandir(settings.DOCUMENTS_DIR) as entries:
+            return [
+                Path(entry.path)
+                for entry in entries
+                if entry.is_file() and Path(entry.name).suffix.lower() in settings.INGEST_EXTENSIONS
+            ]
+    except FileNotFoundError:
+        return []
+
 @app.post("/ingest", response_model=IngestResponse)
 async def ingest_documents():
     """
@@ -78,16 +128,17 @@ async def ingest_documents():
         IngestResponse: Status and details about the ingestion process
     """
     try:
-        # Check if documents directory exists and has files
-        if not settings.DOCUMENTS_DIR.exists() or not any(settings.DOCUMENTS_DIR.iterdir()):
+        # List the supported files once and hand that list to the RAG system
+        files = _list_ingest_files()
+        if not files:
             return IngestResponse(
                 status="error",
                 message="No documents found to ingest",
-                error="Documents directory is empty or does not exist"
+                error="Documents directory has no supported files or does not exist"
             )
         
         # Call the RAG system to ingest documents
-        result = rag_system.ingest_documents()
+        result = await run_in_threadpool(rag_system.ingest_documents, files=files)
         
         # If the RAG system returns a dictionary, use it directly
         if isinstance(result, dict):
@@ -108,7 +159,7 @@ async def ingest_documents():
         )
 
 @app.post("/upload")
-async def upload_document(file: UploadFile = File(...)):
+def upload_document(file: UploadFile = File(...)) -> Dict[str, Any]:
     """Upload a document to the documents directory.
     
     Args:
@@ -141,11 +192,9 @@ async def upload_document(file: UploadFile = File(...)):
                 detail=f"File '{filename}' already exists"
             )
         
-        # Save the uploaded file
+        # Save the uploaded file, copying in chunks to handle large files
         with open(file_path, "wb") as buffer:
-            # Read the file in chunks to handle large files
-            while chunk := await file.read(1024 * 1024):  # 1MB chunks
-                buffer.write(chunk)
+            shutil.copyfileobj(file.file, buffer, 1024 * 1024)  # 1MB chunks
         
         return {
             "status": "success",
@@ -170,33 +219,31 @@ async def upload_document(file: UploadFile = File(...)):
 class QueryRequest(BaseModel):
     question: str
 
-async def stream_response(question: str) -> AsyncGenerator[str, None]:
+async def stream_response(question: str) -> AsyncGenerator[bytes, None]:
     """Stream the response from the RAG system.
     
     Args:
         question: The question to ask the RAG system
         
     Yields:
-        str: Chunks of the response as they're generated
+        bytes: Server-Sent Events carrying chunks of the response as they're generated
     """
     try:
         # Stream the response from the RAG system
-        for chunk in rag_system.query(question, stream=True):
+        async for chunk in rag_system.aquery_stream(question, generation_slot=generation_slot):
             # Format as Server-Sent Event
-            yield f"data: {json.dumps({'text': chunk})}\n\n"
-            # Small delay to allow the client to process the chunk
-            await asyncio.sleep(0.01)
+            yield b"data: " + orjson.dumps({"text": chunk}) + b"\n\n"
         
         # Send a done signal
-        yield "data: [DONE]\n\n"
+        yield b"data: [DONE]\n\n"
     except Exception as e:
         error_msg = f"Error in stream: {str(e)}"
-        yield f"data: {json.dumps({'error': error_msg})}\n\n"
+        yield b"data: " + orjson.dumps({"error": error_msg}) + b"\n\n"
         # Send a done signal after error
-        yield "data: [DONE]\n\n"
+        yield b"data: [DONE]\n\n"
 
 @app.post("/query")
-async def query(query_data: QueryRequest):
+async def query(query_data: QueryRequest) -> Dict[str, Any]:
     """Query the RAG system with a question.
     
     Args:
@@ -209,7 +256,7 @@ async def query(query_data: QueryRequest):
         if not query_data.question.strip():
             raise HTTPException(status_code=400, detail="Question cannot be empty")
         
-        result = rag_system.query(query_data.question, stream=False)
+        result = await rag_system.aquery(query_data.question, generation_slot=generation_slot)
         return result
     except HTTPException:
         raise
@@ -244,22 +291,24 @@ async def query_structured(
     question: str = Form(...),
     response_format: str = Form(...),
     top_k: int = Form(None)
-):
+) -> Dict[str, Any]:
     """Query the RAG system with a question and get a structured response."""
     try:
         if not question:
             raise HTTPException(status_code=400, detail="Question cannot be empty")
         
         try:
-            format_dict = json.loads(response_format)
-        except json.JSONDecodeError:
+            format_dict = orjson.loads(response_format)
+        except orjson.JSONDecodeError:
             raise HTTPException(status_code=400, detail="Invalid JSON format for response_format")
         
-        result = rag_system.query_structured(
-            question=question,
-            response_format=format_dict,
-            top_k=top_k
-        )
+        async with generation_slot():
+            result = await run_in_threadpool(
+                rag_system.query_structured,
+                question=question,
+                response_format=format_dict,
+                top_k=top_k
+            )
         return result
     except HTTPException:
         raise
@@ -267,26 +316,30 @@ async def query_structured(
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/clear")
-async def clear_index():
+async def clear_index() -> Dict[str, Any]:
     """Clear the vector store index."""
     try:
-        result = rag_system.clear_index()
+        # Waits for any running ingest, so keep it off the event loop
+        result = await run_in_threadpool(rag_system.clear_index)
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/documents")
-async def list_documents():
+def list_documents() -> Dict[str, Any]:
     """List all documents in the documents directory."""
     try:
         documents = []
-        for file_path in settings.DOCUMENTS_DIR.glob("*"):
-            if file_path.is_file():
-                documents.append({
-                    "name": file_path.name,
-                    "size": file_path.stat().st_size,
-                    "modified": file_path.stat().st_mtime
-                })
+        # scandir entries carry file type info, so each file needs a single stat
+        with os.scandir(settings.DOCUMENTS_DIR) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    stat = entry.stat()
+                    documents.append({
+                        "name": entry.name,
+                        "size": stat.st_size,
+                        "modified": stat.st_mtime
+                    })
         
         return {
             "status": "success",
@@ -302,12 +355,16 @@ def start():
     print(f"Documents directory: {settings.DOCUMENTS_DIR}")
     print(f"Using model: {settings.LLM_MODEL}")
     
+    # "auto" selects uvloop and httptools when they are installed
+    # (uvloop is unavailable on Windows). Uvicorn ignores workers when reload is on.
     uvicorn.run(
         "app:app",
         host=settings.API_HOST,
         port=settings.API_PORT,
         reload=settings.DEBUG,
-        workers=1
+        workers=settings.API_WORKERS,
+        loop="auto",
+        http="auto"
     )
 
 if __name__ == "__main__":
@@ -11,13 +11,42 @@ BASE_DIR = Path(__file__).parent.parent
 # Model settings
 EMBEDDING_MODEL = "nomic-ai/nomic-embed-text-v1.5"
 LLM_MODEL = "llama3"  # Local model name for Ollama
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "2"))  # Generations allowed at once
+EMBEDDING_BATCH_SIZE = 128  # Chunks per forward pass during ingestion
+QUERY_BATCH_SIZE = 32  # Max concurrent questions embedded in one forward pass
+QUERY_BATCH_WAIT_MS = 5  # How long a question waits for others to batch with
+
+# Cache settings
+EMBEDDING_CACHE_SIZE = 4096  # Number of query embeddings kept in memory
+RESPONSE_CACHE_SIZE = 1024  # Number of generated answers kept in memory
+RESPONSE_CACHE_THRESHOLD = 0.95  # Cosine similarity needed to reuse a cached answer
+RESPONSE_CACHE_PATH = str(BASE_DIR / "data/query_cache.faiss")
+RESPONSE_CACHE_SAVE_EVERY = 20  # Inserts between writes of the response cache
 
 # Vector store settings
 VECTOR_STORE_PATH = str(BASE_DIR / "data/vector_store.faiss")
+# "flat" (exact fp32), "fp16" (half precision), "sq8" (8-bit scalar quantized,
+# value ranges fixed by the first ingest, which must embed at least 512 chunks),
+# "hnsw" (approximate graph, fast up to ~1M vectors) or "ivfpq" (approximate,
+# PQ-compressed, for larger corpora)
+VECTOR_INDEX_TYPE = "fp16"
+HNSW_M = 32  # Graph neighbours per vector
+HNSW_EF_SEARCH = 64  # Higher improves recall at the cost of query latency
+IVF_NLIST = 256  # Coarse clusters; the first "ivfpq" ingest must embed 39 * max(IVF_NLIST, 256) chunks
+IVF_NPROBE = 16  # Clusters scanned per query
+PQ_M = 64  # Bytes per vector for "ivfpq"; must divide the embedding dimension
+# Memory-map the saved index read-only so workers share it via the page cache
+VECTOR_STORE_MMAP = os.getenv("VECTOR_STORE_MMAP", "True").lower() in ("true", "1", "t")
 
 # Document settings
 DOCUMENTS_DIR = BASE_DIR / "data/documents"
 DOCUMENTS_DIR.mkdir(parents=True, exist_ok=True)
+INGEST_EXTENSIONS = {".txt", ".md", ".pdf"}  # File types picked up by /ingest
+# Processes forked to chunk an ingest batch of at least INGEST_POOL_MIN_BYTES;
+# they exit when the batch is done. Off (0) by default: forking a server that
+# has loaded the embedding model and its threads is opt-in.
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "0"))
+INGEST_POOL_MIN_BYTES = int(os.getenv("INGEST_POOL_MIN_BYTES", str(32 * 1024 * 1024)))
 
 # RAG settings
 CHUNK_SIZE = 1000
@@ -28,3 +57,11 @@ TOP_K_RESULTS = 3
 API_HOST = os.getenv("API_HOST", "0.0.0.0")
 API_PORT = int(os.getenv("API_PORT", "8000"))
 DEBUG = os.getenv("DEBUG", "False").lower() in ("true", "1", "t")
+# Each worker holds its own copy of the index, response cache and embedding
+# model, and an /ingest or /clear only updates the worker that handled it, so
+# more than one worker serves stale results until they are restarted
+API_WORKERS = int(os.getenv("WEB_CONCURRENCY", "1"))
+THREADPOOL_SIZE = int(os.getenv("THREADPOOL_SIZE", "200"))  # Threads for sync endpoints
+# FAISS search threads per worker; split the cores across workers so
+# concurrent searches in different processes don't oversubscribe the CPU
+FAISS_OMP_THREADS = int(os.getenv("FAISS_OMP_THREADS", max(1, (os.cpu_count() or 1) // API_WORKERS)))
@@ -0,0 +1,27 @@
+"""Gunicorn configuration for serving the RAG API with Uvicorn workers.
+
+Usage:
+    gunicorn -c gunicorn.conf.py app:app
+"""
+import os
+
+from config import settings
+
+bind = f"{settings.API_HOST}:{settings.API_PORT}"
+
+# UvicornWorker picks up uvloop and httptools automatically when installed
+worker_class = "uvicorn.workers.UvicornWorker"
+# One worker by default: workers don't share the in-memory index or response
+# cache, so an /ingest or /clear handled by one is never seen by the others.
+# Only raise WEB_CONCURRENCY for a read-only index that is ingested offline.
+workers = settings.API_WORKERS
+
+# Import app.py (and load the embedding model) once in the master before
+# forking. Inference never writes to the weights, so the workers keep sharing
+# those pages copy-on-write instead of each holding a private copy. CUDA
+# contexts do not survive fork: set GUNICORN_PRELOAD=false when the embedder
+# runs on a GPU so each worker loads the model itself.
+preload_app = os.getenv("GUNICORN_PRELOAD", "true").lower() in ("true", "1", "t")
+
+# LLM generations routinely take longer than gunicorn's 30s default
+timeout = 300
@@ -1,20 +1,158 @@
-from typing import List
+import asyncio
+import threading
+from collections import OrderedDict
+from typing import List, Callable
 import numpy as np
 from sentence_transformers import SentenceTransformer
 
+class _QueryBatcher:
+    """Collect concurrently submitted queries into a single encode call."""
+
+    def __init__(self, encode: Callable[[List[str]], np.ndarray], max_batch: int, max_wait: float):
+        """Initialize the batcher.
+
+        Args:
+            encode: Blocking function embedding a list of texts
+            max_batch: Maximum number of queries per encode call
+            max_wait: Seconds to wait for more queries after the first arrives
+        """
+        self._encode = encode
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._loop = None
+        self._queue = None
+        self._worker = None
+
+    async def embed(self, text: str) -> np.ndarray:
+        """Queue a query and wait for its embedding."""
+        loop = asyncio.get_running_loop()
+        # The worker task is bound to the loop it was started on
+        if self._loop is not loop or self._worker.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._run())
+
+        future = loop.create_future()
+        self._queue.put_nowait((text, future))
+        return await future
+
+    async def _run(self) -> None:
+        """Drain the queue in batches until the loop shuts down."""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            # Give concurrent requests a short window to join this batch
+            if self._queue.qsize() < self.max_batch - 1:
+                await asyncio.sleep(self.max_wait)
+            while len(batch) < self.max_batch and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+
+            texts = [text for text, _ in batch]
+            try:
+                embeddings = await loop.run_in_executor(None, self._encode, texts)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for (_, future), embedding in zip(batch, embeddings):
+                if not future.done():
+                    future.set_result(embedding)
+
 class NomicEmbedder:
-    def __init__(self, model_name: str = "nomic-ai/nomic-embed-text-v1.5"):
-        """Initialize the Nomic embedding model."""
+    def __init__(
+        self,
+        model_name: str = "nomic-ai/nomic-embed-text-v1.5",
+        cache_size: int = 4096,
+        max_batch: int = 32,
+        max_wait_ms: float = 5.0
+    ):
+        """Initialize the Nomic embedding model.
+
+        Args:
+            model_name: Name of the SentenceTransformer model to load
+            cache_size: Number of query embeddings to keep in memory
+            max_batch: Maximum number of concurrent queries encoded together
+            max_wait_ms: Milliseconds to wait for more concurrent queries before encoding
+        """
         self.model = SentenceTransformer(model_name, trust_remote_code=True)
-        
-    def embed_documents(self, texts: List[str]) -> List[List[float]]:
-        """Embed a list of text documents."""
-        return self.model.encode(texts, convert_to_numpy=True).tolist()
-    
-    def embed_query(self, text: str) -> List[float]:
-        """Embed a single query."""
-        return self.embed_documents([text])[0]
-    
+        self.cache_size = cache_size
+        # LRU of normalized question text -> embedding, shared by the sync
+        # and async paths
+        self._query_cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._batcher = _QueryBatcher(
+            lambda texts: self.embed_documents(texts, batch_size=max_batch),
+            max_batch=max_batch,
+            max_wait=max_wait_ms / 1000
+        )
+
+    def embed_documents(
+        self,
+        texts: List[str],
+        batch_size: int = 64,
+        show_progress_bar: bool = False
+    ) -> np.ndarray:
+        """Embed a list of text documents.
+
+        Args:
+            texts: Texts to embed
+            batch_size: Number of texts per forward pass
+            show_progress_bar: Whether to display an encoding progress bar
+
+        Returns:
+            Array of shape (len(texts), embedding_dimension) with unit-length rows
+        """
+        return self.model.encode(
+            texts,
+            batch_size=batch_size,
+            show_progress_bar=show_progress_bar,
+            convert_to_numpy=True,
+            normalize_embeddings=True
+        ).astype(np.float32, copy=False)
+
+    @staticmethod
+    def _cache_key(text: str) -> str:
+        """Normalize a question into its cache key."""
+        # The tokenizer splits on whitespace, so runs of spaces/newlines and
+        # surrounding padding don't change the embedding and can share a key.
+        return " ".join(text.split())
+
+    def _cache_get(self, key: str):
+        """Return the cached embedding for a key, or None."""
+        with self._cache_lock:
+            embedding = self._query_cache.get(key)
+            if embedding is not None:
+                self._query_cache.move_to_end(key)
+            return embedding
+
+    def _cache_put(self, key: str, embedding: np.ndarray) -> None:
+        """Cache an embedding, evicting the least recently used entry if full."""
+        with self._cache_lock:
+            self._query_cache[key] = embedding
+            self._query_cache.move_to_end(key)
+            if len(self._query_cache) > self.cache_size:
+                self._query_cache.popitem(last=False)
+
+    def embed_query(self, text: str) -> np.ndarray:
+        """Embed a single query, reusing the cached embedding for repeat questions."""
+        key = self._cache_key(text)
+        embedding = self._cache_get(key)
+        if embedding is None:
+            embedding = self.embed_documents([key])[0]
+            self._cache_put(key, embedding)
+        return embedding
+
+    async def aembed_query(self, text: str) -> np.ndarray:
+        """Embed a single query, batching it with other concurrent queries."""
+        key = self._cache_key(text)
+        embedding = self._cache_get(key)
+        if embedding is None:
+            embedding = await self._batcher.embed(key)
+            self._cache_put(key, embedding)
+        return embedding
+
     @property
     def embedding_dimension(self) -> int:
         """Get the dimension of the embeddings."""
@@ -1,11 +1,29 @@
-import json
-from typing import Dict, Any, Optional
+from functools import lru_cache
+from typing import Dict, Any, Optional, AsyncGenerator
 import ollama
+import orjson
+
+@lru_cache(maxsize=128)
+def _system_prompt_for(schema_json: str) -> str:
+    """Build the JSON-only system prompt for a serialized response schema."""
+    # Convert the format to a string description in the caller's property order
+    format_desc = orjson.dumps(orjson.loads(schema_json), option=orjson.OPT_INDENT_2).decode()
+    
+    return f"""You are a helpful assistant that always responds with valid JSON.
+The response must match the following JSON schema exactly:
+
+{format_desc}
+
+Return only the JSON object, without any additional text or markdown formatting."""
 
 class Llama3Client:
     def __init__(self, model_name: str = "llama3"):
         """Initialize the Llama3 client."""
         self.model_name = model_name
+        # Long-lived clients keep their HTTP connections to Ollama alive
+        # instead of opening a new one for every request
+        self._client = ollama.Client()
+        self._aclient = ollama.AsyncClient()
         
     def generate(self, prompt: str, stream: bool = False, **kwargs):
         """Generate text from a prompt.
@@ -15,46 +33,82 @@ class Llama3Client:
             stream: Whether to stream the response
             **kwargs: Additional arguments to pass to the model
             
-        Yields:
-            str: The generated text chunks if streaming
-            
         Returns:
-            str: The complete generated text if not streaming
+            Union[str, Generator[str, None, None]]:
+                - If not streaming: The complete generated text
+                - If streaming: Generator yielding text chunks as they're generated
         """
         if stream:
-            response = ollama.generate(
-                model=self.model_name,
-                prompt=prompt,
-                stream=True,
-                **kwargs
-            )
-            for chunk in response:
-                if 'response' in chunk:
-                    yield chunk['response']
-        else:
-            response = ollama.generate(
-                model=self.model_name,
-                prompt=prompt,
-                stream=False,
-                **kwargs
-            )
-            return response['response']
+            return self._stream(prompt, **kwargs)
+        
+        response = self._client.generate(
+            model=self.model_name,
+            prompt=prompt,
+            stream=False,
+            **kwargs
+        )
+        return response['response']
+    
+    def _stream(self, prompt: str, **kwargs):
+        """Yield generated text chunks for a prompt."""
+        response = self._client.generate(
+            model=self.model_name,
+            prompt=prompt,
+            stream=True,
+            **kwargs
+        )
+        for chunk in response:
+            if 'response' in chunk:
+                yield chunk['response']
+    
+    async def acomplete(self, prompt: str, **kwargs) -> str:
+        """Generate the complete text for a prompt using the async client.
+        
+        Args:
+            prompt: The prompt to generate text from
+            **kwargs: Additional arguments to pass to the model
+            
+        Returns:
+            str: The complete generated text
+        """
+        response = await self._aclient.generate(
+            model=self.model_name,
+            prompt=prompt,
+            stream=False,
+            **kwargs
+        )
+        return response['response']
+    
+    async def agenerate(self, prompt: str, **kwargs) -> AsyncGenerator[str, None]:
+        """Stream generated text chunks for a prompt using the async client.
+        
+        Args:
+            prompt: The prompt to generate text from
+            **kwargs: Additional arguments to pass to the model
+            
+        Yields:
+            str: The generated text chunks
+        """
+        response = await self._aclient.generate(
+            model=self.model_name,
+            prompt=prompt,
+            stream=True,
+            **kwargs
+        )
+        async for chunk in response:
+            if 'response' in chunk:
+                yield chunk['response']
     
     def generate_structured(self, prompt: str, response_format: Dict[str, Any]) -> Dict[str, Any]:
         """Generate structured output based on the response format."""
-        # Convert the format to a string description
-        format_desc = json.dumps(response_format, indent=2)
-        
-        # Create a system message that enforces the output format
-        system_prompt = f"""You are a helpful assistant that always responds with valid JSON.
-The response must match the following JSON schema exactly:
-
-{format_desc}
-
-Return only the JSON object, without any additional text or markdown formatting."""
+        # Create a system message that enforces the output format; keyed on
+        # the schema JSON so repeated formats reuse the prompt. Keys are not
+        # sorted: the prompt lists the properties in the order given.
+        schema_json = orjson.dumps(response_format).decode()
+        system_prompt = _system_prompt_for(schema_json)
         
         try:
-            response = ollama.chat(
+            response = self._client.chat(
                 model=self.model_name,
                 messages=[
                     {"role": "system", "content": system_prompt},
@@ -72,9 +126,9 @@ Return only the JSON object, without any additional text or markdown formatting.
             elif response_text.startswith('```'):
                 response_text = response_text[3:-3]  # Remove ``` and ```
                 
-            return json.loads(response_text)
+            return orjson.loads(response_text)
             
-        except json.JSONDecodeError as e:
+        except orjson.JSONDecodeError as e:
             # Fallback to text generation if JSON parsing fails
             print(f"Failed to parse JSON response: {e}")
             response = self.generate(prompt)
@@ -1,6 +1,9 @@
 import os
+import asyncio
+import threading
+from contextlib import asynccontextmanager
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple, AsyncGenerator
 import json
 from datetime import datetime
 
@@ -9,6 +12,49 @@ from src.embedding.nomic_embedder import NomicEmbedder
 from src.llm.llama3_client import Llama3Client
 from src.vectorstore.faiss_store import FAISSStore
 from src.utils.document_processor import DocumentProcessor
+from src.utils.semantic_cache import SemanticCache
+
+# Prompts are kept flush-left: indentation inside the template would be sent
+# to the LLM as extra tokens on every request.
+_ANSWER_PROMPT = """### INSTRUCTIONS ###
+You are an AI assistant that provides direct, factual answers based on the provided context.
+
+RULES:
+1. Answer ONLY with the specific information requested in the question.
+2. If the question asks for a list, provide a bulleted list.
+3. If the question asks for a number, provide just the number.
+4. If the question is a yes/no question, answer with just "Yes" or "No".
+5. If the context doesn't contain the answer, respond with "I don't know".
+6. Do not include any explanations, justifications, or references to the context.
+7. Be as concise as possible.
+
+### CONTEXT ###
+{context}
+
+### QUESTION ###
+{question}
+
+### ANSWER ###
+"""
+
+_STRUCTURED_PROMPT = """You are a helpful assistant that answers questions based on the provided context.
+
+Context:
+{context}
+
+Question: {question}
+
+Answer the question based on the context above. If the context doesn't contain the answer, indicate this in your response.
+"""
+
+@asynccontextmanager
+async def _acquire(generation_slot):
+    """Enter the generation slot if one was given, otherwise run unlimited."""
+    if generation_slot is None:
+        yield
+    else:
+        async with generation_slot():
+            yield
 
 class RAGSystem:
     """Main RAG system for question answering."""
@@ -18,74 +64,249 @@ class RAGSystem:
         print("Initializing RAG system...")
         
         # Initialize components
-        self.embedder = NomicEmbedder(settings.EMBEDDING_MODEL)
+        self.embedder = NomicEmbedder(
+            settings.EMBEDDING_MODEL,
+            cache_size=settings.EMBEDDING_CACHE_SIZE,
+            max_batch=settings.QUERY_BATCH_SIZE,
+            max_wait_ms=settings.QUERY_BATCH_WAIT_MS
+        )
         self.llm = Llama3Client(settings.LLM_MODEL)
         self.vector_store = FAISSStore(
             vector_dim=self.embedder.embedding_dimension,
-            index_path=settings.VECTOR_STORE_PATH
+            index_path=settings.VECTOR_STORE_PATH,
+            index_type=settings.VECTOR_INDEX_TYPE,
+            mmap=settings.VECTOR_STORE_MMAP,
+            hnsw_m=settings.HNSW_M,
+            hnsw_ef_search=settings.HNSW_EF_SEARCH,
+            ivf_nlist=settings.IVF_NLIST,
+            ivf_nprobe=settings.IVF_NPROBE,
+            pq_m=settings.PQ_M,
+            omp_threads=settings.FAISS_OMP_THREADS
         )
         self.document_processor = DocumentProcessor(
             chunk_size=settings.CHUNK_SIZE,
-            chunk_overlap=settings.CHUNK_OVERLAP
+            chunk_overlap=settings.CHUNK_OVERLAP,
+            workers=settings.INGEST_WORKERS,
+            pool_min_bytes=settings.INGEST_POOL_MIN_BYTES
+        )
+        # Maps question embeddings to previously generated answers
+        self._response_cache = SemanticCache(
+            vector_dim=self.embedder.embedding_dimension,
+            threshold=settings.RESPONSE_CACHE_THRESHOLD,
+            max_size=settings.RESPONSE_CACHE_SIZE,
+            path=settings.RESPONSE_CACHE_PATH,
+            save_every=settings.RESPONSE_CACHE_SAVE_EVERY
         )
         
+        # Serializes ingest and clear, which run in threadpool threads
+        self._write_lock = threading.Lock()
+        # Bumped whenever the corpus changes, so answers generated from an
+        # older retrieval are not cached after the cache was cleared
+        self._corpus_generation = 0
+        self._cache_lock = threading.Lock()
+        
         print(f"RAG system initialized with model: {settings.LLM_MODEL}")
     
-    def ingest_documents(self, directory: Optional[Path] = None) -> Dict[str, Any]:
+    def ingest_documents(
+        self,
+        directory: Optional[Path] = None,
+        files: Optional[List[Path]] = None
+    ) -> Dict[str, Any]:
         """Ingest documents from a directory into the vector store.
         
+        Only one ingest or clear runs at a time; concurrent calls wait.
+        
         Args:
             directory: Directory containing documents to ingest. Uses settings.DOCUMENTS_DIR if None.
+            files: Files to ingest. When given, the directory is not scanned again.
             
         Returns:
             Dictionary with ingestion statistics
         """
-        if directory is None:
-            directory = settings.DOCUMENTS_DIR
-        
-        print(f"Ingesting documents from: {directory}")
-        
-        # Process all documents in the directory
-        chunks = self.document_processor.process_directory(directory)
+        with self._write_lock:
+            return self._ingest_documents(directory, files)
+    
+    def _ingest_documents(
+        self,
+        directory: Optional[Path] = None,
+        files: Optional[List[Path]] = None
+    ) -> Dict[str, Any]:
+        """Ingest documents; the caller must hold the write lock."""
+        if files is not None:
+            print(f"Ingesting {len(files)} documents")
+            chunks = self.document_processor.process_files(files)
+        else:
+            if directory is None:
+                directory = settings.DOCUMENTS_DIR
+            
+            print(f"Ingesting documents from: {directory}")
+            
+            # Process all documents in the directory
+            chunks = self.document_processor.process_directory(directory)
         
         if not chunks:
             return {"status": "error", "message": "No documents found to process"}
         
         print(f"Processed {len(chunks)} chunks from documents")
         
-        # Extract texts and metadata
-        texts = [chunk["text"] for chunk in chunks]
-        metadatas = [
-            {k: v for k, v in chunk.items() if k != "text"}
-            for chunk in chunks
+        # Skip chunks whose content is already indexed; the processor has
+        # already dropped repeats within this batch
+        new_chunks = [
+            chunk for chunk in chunks
+            if not self.vector_store.has_chunk(chunk.chunk_id)
         ]
+        skipped = len(chunks) - len(new_chunks)
+        chunks = new_chunks
+        
+        if not chunks:
+            return {
+                "status": "success",
+                "message": "No new or changed chunks to ingest",
+                "chunks_processed": 0,
+                "chunks_skipped": skipped,
+                "total_vectors": self.vector_store.index.ntotal
+            }
+        
+        print(f"Embedding {len(chunks)} new chunks ({skipped} unchanged skipped)")
+        
+        # Extract texts and metadata
+        texts = [chunk.text for chunk in chunks]
+        metadatas = [chunk.to_metadata() for chunk in chunks]
         
         # Generate embeddings
         print("Generating embeddings...")
-        embeddings = self.embedder.embed_documents(texts)
+        embeddings = self.embedder.embed_documents(
+            texts,
+            batch_size=settings.EMBEDDING_BATCH_SIZE,
+            show_progress_bar=True
+        )
         
         # Add to vector store
         print("Adding to vector store...")
         self.vector_store.add_embeddings(texts, embeddings, metadatas)
         self.vector_store.save()
         
+        # Cached answers may be stale now that the corpus changed
+        self._invalidate_answers()
+        
         return {
             "status": "success",
+            "message": "Documents ingested successfully",
             "chunks_processed": len(chunks),
+            "chunks_skipped": skipped,
             "total_vectors": self.vector_store.index.ntotal
         }
     
+    @staticmethod
+    def _format_context(relevant_chunks: List[Dict[str, Any]]) -> Tuple[str, List[Dict[str, Any]]]:
+        """Build the prompt context and the source list in a single pass.
+        
+        Args:
+            relevant_chunks: Chunks returned by the vector store search
+            
+        Returns:
+            Tuple of (context string, list of truncated sources)
+        """
+        context_parts = []
+        sources = []
+        for i, chunk in enumerate(relevant_chunks):
+            text = chunk["text"]
+            score = chunk["score"]
+            context_parts.append(f"[Document {i+1}, Score: {score:.2f}]\n{text}")
+            sources.append({
+                "document": chunk.get("document_name", "Unknown"),
+                "score": score,
+                "text": text[:200] + "..."  # Truncate long texts
+            })
+        return "\n\n".join(context_parts), sources
+    
+    def _prepare_query(self, question: str, top_k: int, query_embedding=None):
+        """Embed the question and either hit the response cache or build the prompt.
+        
+        Args:
+            question: The question to ask
+            top_k: Number of relevant chunks to retrieve
+            query_embedding: Precomputed question embedding, if already available
+            
+        Returns:
+            Tuple of (query_embedding, cached, prompt, sources, generation). On
+            a cache hit `cached` holds the stored answer and the prompt/sources
+            are None; `generation` is the corpus generation retrieval saw.
+        """
+        # Generate query embedding
+        if query_embedding is None:
+            query_embedding = self.embedder.embed_query(question)
+        
+        # Read before retrieval, so a corpus change during retrieval or
+        # generation keeps the answer out of the cache
+        generation = self._corpus_generation
+        
+        # Check the response cache before doing any retrieval or generation
+        cached = self._response_cache.lookup(query_embedding)
+        if cached is not None and cached["top_k"] == top_k:
+            return query_embedding, cached, None, None, generation
+        
+        # Retrieve relevant chunks
+        relevant_chunks = self.vector_store.similarity_search(query_embedding, k=top_k)
+        
+        # Format context and sources
+        context, sources = self._format_context(relevant_chunks)
+        
+        # Generate prompt with more explicit instructions
+        prompt = _ANSWER_PROMPT.format(context=context, question=question)
+        
+        return query_embedding, None, prompt, sources, generation
+    
+    @staticmethod
+    def _build_response(
+        question: str,
+        answer: str,
+        sources: List[Dict[str, Any]],
+        cached: bool
+    ) -> Dict[str, Any]:
+        """Assemble the query response returned to API clients."""
+        return {
+            "question": question,
+            "answer": answer,
+            "sources": sources,
+            "timestamp": datetime.utcnow().isoformat(),
+            "cached": cached
+        }
+    
+    def _cache_answer(
+        self,
+        query_embedding,
+        answer: str,
+        sources: List[Dict[str, Any]],
+        top_k: int,
+        generation: int
+    ) -> None:
+        """Store a generated answer, unless the corpus changed since its retrieval."""
+        with self._cache_lock:
+            if generation != self._corpus_generation:
+                return
+            self._response_cache.add(
+                query_embedding,
+                {"answer": answer, "sources": sources, "top_k": top_k}
+            )
+    
+    def _invalidate_answers(self) -> None:
+        """Drop cached answers and reject ones still being generated."""
+        with self._cache_lock:
+            self._corpus_generation += 1
+            self._response_cache.clear()
+    
     def query(self, question: str, top_k: int = None, stream: bool = False):
         """Query the RAG system with a question.
         
+        Repeat and near-duplicate questions are answered from the response
+        cache, skipping both retrieval and generation.
+        
         Args:
             question: The question to ask
             top_k: Number of relevant chunks to retrieve (defaults to settings.TOP_K_RESULTS)
             stream: Whether to stream the response
             
-        Yields:
-            str: Chunks of the generated response if streaming
-            
         Returns:
             Union[Dict[str, Any], Generator[str, None, None]]: 
                 - If not streaming: Dictionary containing the answer and relevant context
@@ -94,82 +315,117 @@ class RAGSystem:
         if top_k is None:
             top_k = settings.TOP_K_RESULTS
         
-        # Generate query embedding
-        query_embedding = self.embedder.embed_query(question)
+        query_embedding, cached, prompt, sources, generation = self._prepare_query(question, top_k)
         
-        # Retrieve relevant chunks
-        relevant_chunks = self.vector_store.similarity_search(query_embedding, k=top_k)
+        if cached is not None:
+            if stream:
+                return iter([cached["answer"]])
+            return self._build_response(question, cached["answer"], cached["sources"], cached=True)
+        
+        if stream:
+            return self._stream_answer(query_embedding, prompt, sources, top_k, generation)
         
-        # Format context
-        context = "\n\n".join(
-            f"[Document {i+1}, Score: {chunk['score']:.2f}]\n{chunk['text']}"
-            for i, chunk in enumerate(relevant_chunks)
+        answer = self.llm.generate(prompt, stream=False).strip()
+        self._cache_answer(query_embedding, answer, sources, top_k, generation)
+        
+        return self._build_response(question, answer, sources, cached=False)
+    
+    async def aquery(self, question: str, top_k: int = None, generation_slot=None) -> Dict[str, Any]:
+        """Query the RAG system without blocking the event loop.
+        
+        Args:
+            question: The question to ask
+            top_k: Number of relevant chunks to retrieve (defaults to settings.TOP_K_RESULTS)
+            generation_slot: Optional factory returning an async context manager
+                that is held while the LLM generates, used to cap concurrent generations
+            
+        Returns:
+            Dictionary containing the answer and relevant context
+        """
+        if top_k is None:
+            top_k = settings.TOP_K_RESULTS
+        
+        # Concurrent questions share a single embedding forward pass
+        query_embedding = await self.embedder.aembed_query(question)
+        
+        loop = asyncio.get_running_loop()
+        query_embedding, cached, prompt, sources, generation = await loop.run_in_executor(
+            None, self._prepare_query, question, top_k, query_embedding
         )
         
-        # Generate prompt with more explicit instructions
-        prompt = f"""### INSTRUCTIONS ###
-        You are an AI assistant that provides direct, factual answers based on the provided context.
+        # Cache hits never wait for a generation slot
+        if cached is not None:
+            return self._build_response(question, cached["answer"], cached["sources"], cached=True)
         
-        RULES:
-        1. Answer ONLY with the specific information requested in the question.
-        2. If the question asks for a list, provide a bulleted list.
-        3. If the question asks for a number, provide just the number.
-        4. If the question is a yes/no question, answer with just "Yes" or "No".
-        5. If the context doesn't contain the answer, respond with "I don't know".
-        6. Do not include any explanations, justifications, or references to the context.
-        7. Be as concise as possible.
+        async with _acquire(generation_slot):
+            answer = (await self.llm.acomplete(prompt)).strip()
+        self._cache_answer(query_embedding, answer, sources, top_k, generation)
         
-        ### CONTEXT ###
-        {context}
+        return self._build_response(question, answer, sources, cached=False)
+    
+    def _stream_answer(
+        self,
+        query_embedding,
+        prompt: str,
+        sources: List[Dict[str, Any]],
+        top_k: int,
+        generation: int
+    ):
+        """Stream the LLM answer, caching the full response once it completes.
         
-        ### QUESTION ###
-        {question}
+        Yields:
+            str: Chunks of the generated response
+        """
+        full_response = ""
+        for chunk in self.llm.generate(prompt, stream=True):
+            full_response += chunk
+            yield chunk
+        
+        self._cache_answer(query_embedding, full_response.strip(), sources, top_k, generation)
+    
+    async def aquery_stream(
+        self,
+        question: str,
+        top_k: int = None,
+        generation_slot=None
+    ) -> AsyncGenerator[str, None]:
+        """Stream the answer to a question without blocking the event loop.
+        
+        The question is embedded through the embedder's micro-batching queue,
+        retrieval runs in the default executor and generation uses the async
+        Ollama client.
         
-        ### ANSWER ###
+        Args:
+            question: The question to ask
+            top_k: Number of relevant chunks to retrieve (defaults to settings.TOP_K_RESULTS)
+            generation_slot: Optional factory returning an async context manager
+                that is held while the LLM generates, used to cap concurrent generations
+            
+        Yields:
+            str: Chunks of the generated response
         """
+        if top_k is None:
+            top_k = settings.TOP_K_RESULTS
         
-        if stream:
-            # For streaming, yield each chunk as it's generated
-            full_response = ""
-            for chunk in self.llm.generate(prompt, stream=True):
+        # Concurrent questions share a single embedding forward pass
+        query_embedding = await self.embedder.aembed_query(question)
+        
+        loop = asyncio.get_running_loop()
+        query_embedding, cached, prompt, sources, generation = await loop.run_in_executor(
+            None, self._prepare_query, question, top_k, query_embedding
+        )
+        
+        if cached is not None:
+            yield cached["answer"]
+            return
+        
+        full_response = ""
+        async with _acquire(generation_slot):
+            async for chunk in self.llm.agenerate(prompt):
                 full_response += chunk
                 yield chunk
-                
-            # After streaming is complete, you can return metadata if needed
-            # This won't be used in the streaming case, but we keep it for consistency
-            return {
-                "question": question,
-                "answer": full_response.strip(),
-                "sources": [
-                    {
-                        "document": chunk.get("document_name", "Unknown"),
-                        "score": chunk.get("score", 0.0),
-                        "text": chunk.get("text", "")[:200] + "..."
-                    }
-                    for chunk in relevant_chunks
-                ],
-                "timestamp": datetime.utcnow().isoformat()
-            }
-        else:
-            # Non-streaming behavior remains the same
-            answer = self.llm.generate(prompt, stream=False)
-            
-            # Prepare sources
-            sources = [
-                {
-                    "document": chunk.get("document_name", "Unknown"),
-                    "score": chunk.get("score", 0.0),
-                    "text": chunk.get("text", "")[:200] + "..."
-                }
-                for chunk in relevant_chunks
-            ]
-            
-            return {
-                "question": question,
-                "answer": answer.strip(),
-                "sources": sources,
-                "timestamp": datetime.utcnow().isoformat()
-            }
+        
+        self._cache_answer(query_embedding, full_response.strip(), sources, top_k, generation)
     
     def query_structured(
         self, 
@@ -196,37 +452,15 @@ class RAGSystem:
         # Retrieve relevant chunks
         relevant_chunks = self.vector_store.similarity_search(query_embedding, k=top_k)
         
-        # Format context
-        context = "\n\n".join(
-            f"[Document {i+1}, Score: {chunk['score']:.2f}]\n{chunk['text']}"
-            for i, chunk in enumerate(relevant_chunks)
-        )
+        # Format context and sources
+        context, sources = self._format_context(relevant_chunks)
         
         # Generate prompt for structured response
-        prompt = f"""You are a helpful assistant that answers questions based on the provided context.
-        
-        Context:
-        {context}
-        
-        Question: {question}
-        
-        Answer the question based on the context above. If the context doesn't contain the answer, 
-        indicate this in your response.
-        """
+        prompt = _STRUCTURED_PROMPT.format(context=context, question=question)
         
         # Generate structured response
         response = self.llm.generate_structured(prompt, response_format)
         
-        # Prepare sources
-        sources = [
-            {
-                "document": chunk.get("document_name", "Unknown"),
-                "score": chunk.get("score", 0.0),
-                "text": chunk.get("text", "")[:200] + "..."  # Truncate long texts
-            }
-            for chunk in relevant_chunks
-        ]
-        
         return {
             "question": question,
             "answer": response,
@@ -240,6 +474,12 @@ class RAGSystem:
         Returns:
             Status of the operation
         """
-        self.vector_store.clear()
-        self.vector_store.save()
+        with self._write_lock:
+            self.vector_store.clear()
+            self.vector_store.save()
+            self._invalidate_answers()
         return {"status": "success", "message": "Vector store index cleared"}
+    
+    def save_caches(self) -> None:
+        """Persist the response cache so answers survive restarts."""
+        self._response_cache.save()
@@ -1,148 +1,347 @@
+import os
+import mmap
+from collections import deque
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Iterator, Set, Deque, Tuple, Union, Callable, NamedTuple
 import re
-import hashlib
+import xxhash
 from tqdm import tqdm
 
+class _Syntax(NamedTuple):
+    """Separators and helpers for splitting either str or bytes text."""
+    para_sep: Any  # Paragraph separator
+    sent_sep: Any  # Joins sentences of an oversized paragraph
+    colon: Any  # Heading suffix
+    whitespace: Any  # Characters strip() removes (None for the str default)
+    sent_split: Any  # Compiled sentence-boundary pattern
+    encode: Callable[[Any], bytes]  # Text to the UTF-8 bytes chunks are built from
+
+def _identity(value):
+    return value
+
+# Patterns are compiled once at import instead of on every split
+_STR_SYNTAX = _Syntax(
+    para_sep='\n\n',
+    sent_sep=' ',
+    colon=':',
+    whitespace=None,
+    sent_split=re.compile(r'(?<=[.!?])\s+'),
+    encode=str.encode,
+)
+# Pure-ASCII text is split as bytes, so building chunks needs no encode and
+# only emitted chunks are decoded. str.strip() and str's \s also treat
+# \x1c-\x1f as whitespace, so they are spelled out to give identical chunks.
+_BYTES_SYNTAX = _Syntax(
+    para_sep=b'\n\n',
+    sent_sep=b' ',
+    colon=b':',
+    whitespace=b' \t\n\r\x0b\x0c\x1c\x1d\x1e\x1f',
+    sent_split=re.compile(rb'(?<=[.!?])[\s\x1c-\x1f]+'),
+    encode=_identity,
+)
+
+# Finds a non-ASCII byte in buffers that lack bytes.isascii(), such as mmaps
+_NON_ASCII = re.compile(rb'[\x80-\xff]')
+
+def _iter_paragraphs(text, syntax: _Syntax = _STR_SYNTAX) -> Iterator[Any]:
+    """Yield the stripped, non-empty paragraphs of text in a single forward scan.
+    
+    Paragraphs are separated by blank lines; runs of three or more newlines
+    leave empty or whitespace-only pieces, which are skipped.
+    """
+    sep = syntax.para_sep
+    whitespace = syntax.whitespace
+    start: int = 0
+    n: int = len(text)
+    while start < n:
+        end = text.find(sep, start)
+        if end < 0:
+            end = n
+        paragraph = text[start:end].strip(whitespace)
+        if paragraph:
+            yield paragraph
+        start = end + 2
+
+class Chunk:
+    """A piece of a document ready to be embedded.
+    
+    Slots give every chunk the same fixed layout, so large ingests don't
+    allocate a dict per chunk.
+    """
+    
+    __slots__ = ('text', 'chunk_id', 'length', 'document_id', 'document_path', 'document_name')
+    
+    def __init__(
+        self,
+        text: str,
+        chunk_id: str,
+        document_id: Optional[str] = None,
+        document_path: Optional[str] = None,
+        document_name: Optional[str] = None
+    ):
+        """Initialize the chunk.
+        
+        Args:
+            text: The chunk text
+            chunk_id: Fingerprint of the chunk text
+            document_id: Stem of the source file
+            document_path: Path of the source file
+            document_name: File name of the source file
+        """
+        self.text = text
+        self.chunk_id = chunk_id
+        self.length = len(text)
+        self.document_id = document_id
+        self.document_path = document_path
+        self.document_name = document_name
+    
+    def to_metadata(self) -> Dict[str, Any]:
+        """Return the fields stored alongside the chunk's vector (all but the text)."""
+        return {
+            'chunk_id': self.chunk_id,
+            'length': self.length,
+            'document_id': self.document_id,
+            'document_path': self.document_path,
+            'document_name': self.document_name,
+        }
+    
+    def __reduce__(self) -> Tuple[Any, ...]:
+        # Rebuild through __init__ when pickled back from a pool worker; the
+        # default slot-state pickling doesn't work once mypyc compiles the class
+        return (Chunk, (self.text, self.chunk_id, self.document_id, self.document_path, self.document_name))
+    
+    def __repr__(self) -> str:
+        return f"Chunk(chunk_id={self.chunk_id!r}, length={self.length}, document_name={self.document_name!r})"
+
+class _ChunkAssembler:
+    """Accumulate paragraphs and sentences into chunks of bounded size.
+    
+    Pieces are appended to a UTF-8 buffer as they arrive, so emitting a
+    chunk hashes and decodes that buffer once instead of joining the pieces
+    and encoding the result.
+    """
+    
+    def __init__(self, chunk_size: int):
+        """Initialize the assembler.
+        
+        Args:
+            chunk_size: Maximum length of a chunk's text
+        """
+        self.chunk_size = chunk_size
+        self.chunks: List[Chunk] = []
+        self.reset()
+    
+    def reset(self) -> None:
+        """Start an empty chunk."""
+        # (UTF-8 piece, len(piece) in characters, UTF-8 separator placed
+        # before it) of the chunk being built
+        self.parts: Deque[Tuple[bytes, int, bytes]] = deque()
+        # Length of the joined chunk text in characters, kept as pieces come
+        # and go so overlap trimming never rescans the retained pieces
+        self.length: int = 0
+        # The joined chunk text, UTF-8 encoded
+        self.buffer = bytearray()
+        # Whether the chunk was started by a heading and not trimmed since
+        self.opened_by_heading = False
+    
+    def fits(self, piece_length: int, sep_length: int) -> bool:
+        """Whether a piece can be added without the chunk exceeding chunk_size."""
+        return not self.parts or self.length + sep_length + piece_length <= self.chunk_size
+    
+    def add(self, piece: bytes, piece_length: int, sep: bytes) -> None:
+        """Append a piece, preceded by sep unless it starts the chunk."""
+        if self.parts:
+            self.length += len(sep)
+            self.buffer += sep
+        self.buffer += piece
+        self.parts.append((piece, piece_length, sep))
+        self.length += piece_length
+    
+    def emit(self) -> None:
+        """Finalize the current pieces as a chunk; they stay available for overlap."""
+        buffer = self.buffer
+        self.chunks.append(Chunk(buffer.decode('utf-8'), xxhash.xxh3_128_hexdigest(buffer)))
+    
+    def keep_overlap(self, next_length: int = 0, next_sep_length: int = 0) -> None:
+        """Keep the last piece or two of the emitted chunk to start the next one.
+        
+        Leading pieces are dropped until at most two remain and the next
+        piece (if given) fits after them.
+        """
+        parts = self.parts
+        self.opened_by_heading = False
+        dropped = False
+        while len(parts) > 2 or (next_length and parts and not self.fits(next_length, next_sep_length)):
+            _, piece_length, _ = parts.popleft()
+            self.length -= piece_length
+            if parts:
+                # The new first piece loses the separator in front of it
+                self.length -= len(parts[0][2])
+            dropped = True
+        if dropped:
+            # Rebuild the buffer from the (at most two) retained pieces
+            buffer = bytearray()
+            for i, (piece, _, sep) in enumerate(parts):
+                if i:
+                    buffer += sep
+                buffer += piece
+            self.buffer = buffer
+
 class DocumentProcessor:
     """Process documents for the RAG system."""
     
-    def __init__(self, chunk_size: int = 1000, chunk_overlap: int = 200):
+    # Files at least this large are memory-mapped rather than read into memory
+    MMAP_THRESHOLD = 4194304  # 4 MiB
+    
+    def __init__(
+        self,
+        chunk_size: int = 1000,
+        chunk_overlap: int = 200,
+        dedup: bool = True,
+        workers: int = 0,
+        pool_min_bytes: int = 33554432
+    ):
         """Initialize the document processor.
         
         Args:
             chunk_size: Maximum size of each text chunk in characters
             chunk_overlap: Number of characters to overlap between chunks
+            dedup: Drop chunks repeated across the files of one process_files
+                call, e.g. boilerplate headers and footers
+            workers: Processes that chunk large batches; below 2 every
+                batch is chunked in-process
+            pool_min_bytes: Smallest total file size chunked in worker
+                processes; smaller batches are chunked in-process
         """
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
+        self.dedup = dedup
+        self.workers = workers
+        self.pool_min_bytes = pool_min_bytes
     
-    def load_document(self, file_path: Path) -> str:
-        """Load text from a document file.
+    def _drop_seen(self, chunks: List[Chunk], seen: Set[str]) -> List[Chunk]:
+        """Filter out chunks whose fingerprint is in seen, recording the new ones."""
+        if not self.dedup:
+            return chunks
+        unique: List[Chunk] = []
+        for chunk in chunks:
+            if chunk.chunk_id not in seen:
+                seen.add(chunk.chunk_id)
+                unique.append(chunk)
+        return unique
+    
+    def load_document(self, file_path: Path) -> Union[bytes, mmap.mmap]:
+        """Load the raw UTF-8 content of a document file.
+        
+        Files of at least MMAP_THRESHOLD bytes are returned as a read-only
+        mmap, so their pages are faulted in from the page cache as the
+        splitter reaches them instead of being copied up front; the caller
+        should close it when done.
         
         Args:
             file_path: Path to the document file
             
         Returns:
-            The text content of the document
+            The bytes of the document, with newlines normalized to '\\n'
         """
-        with open(file_path, 'r', encoding='utf-8') as f:
-            return f.read()
+        if file_path.stat().st_size >= self.MMAP_THRESHOLD:
+            with open(file_path, 'rb') as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            if mapped.find(b'\r') < 0:
+                return mapped
+            # Newlines need rewriting, which takes a private copy anyway
+            mapped.close()
+        
+        # Read in one call; decoding is left to split_into_chunks, which
+        # only decodes the emitted chunks of ASCII documents
+        data = file_path.read_bytes()
+        # Keep text mode's universal newlines so paragraph splitting still
+        # sees '\n\n' in Windows-edited files
+        if b'\r' in data:
+            data = data.replace(b'\r\n', b'\n').replace(b'\r', b'\n')
+        return data
     
-    def split_into_chunks(self, text: str) -> List[Dict[str, Any]]:
+    def split_into_chunks(self, text: Union[str, bytes, mmap.mmap]) -> List[Chunk]:
         """Split text into chunks with metadata, preserving context and structure.
         
         Args:
-            text: The text to split into chunks
+            text: The text to split into chunks, as str, UTF-8 bytes or an
+                mmap of a UTF-8 file
             
         Returns:
             List of chunks with metadata
         """
-        if not text.strip():
-            return []
+        # ASCII text is split as bytes; anything else is split as str so
+        # lengths count characters and Unicode whitespace is honoured.
+        # An mmap is only scanned here; paragraphs are copied out as found.
+        if isinstance(text, str):
+            syntax = _STR_SYNTAX
+        elif text.isascii() if isinstance(text, bytes) else _NON_ASCII.search(text) is None:
+            syntax = _BYTES_SYNTAX
+        else:
+            text = str(text, 'utf-8')
+            syntax = _STR_SYNTAX
         
-        # First, split by double newlines to preserve paragraphs
-        paragraphs = [p.strip() for p in text.split('\n\n') if p.strip()]
+        # Locals are annotated so the loop compiles to native code under mypyc
+        chunk_size: int = self.chunk_size
+        encode = syntax.encode
+        para_sep: bytes = encode(syntax.para_sep)
+        para_sep_length: int = len(para_sep)
+        sent_sep: bytes = encode(syntax.sent_sep)
+        sent_split = syntax.sent_split
+        whitespace = syntax.whitespace
+        assembler = _ChunkAssembler(chunk_size)
         
-        chunks = []
-        current_chunk = []
-        current_length = 0
-        
-        for paragraph in paragraphs:
+        # Walk the paragraphs (split on double newlines) as they are found
+        for paragraph in _iter_paragraphs(text, syntax):
+            paragraph_length: int = len(paragraph)
             # If paragraph is a heading or title (ends with a colon or is in all caps)
-            is_heading = paragraph.endswith(':') or (len(paragraph) < 100 and paragraph.isupper())
-            
-            # If adding this paragraph would exceed chunk size, finalize current chunk
-            if current_chunk and current_length + len(paragraph) > self.chunk_size:
-                chunk_text = '\n\n'.join(current_chunk)
-                chunk_id = hashlib.md5(chunk_text.encode()).hexdigest()
-                chunks.append({
-                    'text': chunk_text,
-                    'chunk_id': chunk_id,
-                    'length': len(chunk_text)
-                })
-                
-                # Start a new chunk with overlap (last paragraph or two)
-                overlap_paragraphs = min(2, len(current_chunk))
-                current_chunk = current_chunk[-overlap_paragraphs:]
-                current_length = sum(len(p) + 2 for p in current_chunk)  # +2 for newlines
+            is_heading = paragraph.endswith(syntax.colon) or (paragraph_length < 100 and paragraph.isupper())
             
-            # Add paragraph to current chunk
-            current_chunk.append(paragraph)
-            current_length += len(paragraph) + 2  # +2 for newlines
+            # A paragraph longer than a chunk is fed in sentence by sentence,
+            # so no chunk has to be split again after it is built
+            if paragraph_length > chunk_size:
+                pieces: List[Tuple[Any, int]] = []
+                for sentence in sent_split.split(paragraph):
+                    sentence = sentence.strip(whitespace)
+                    if sentence:
+                        pieces.append((sentence, len(sentence)))
+            else:
+                pieces = [(paragraph, paragraph_length)]
             
             # If this is a heading, ensure it's at the start of a chunk
-            if is_heading and len(current_chunk) > 1:
-                # Move the heading to the next chunk
-                heading = current_chunk.pop()
-                current_length -= len(heading) + 2
-                
-                # Finalize current chunk if not empty
-                if current_chunk:
-                    chunk_text = '\n\n'.join(current_chunk)
-                    chunk_id = hashlib.md5(chunk_text.encode()).hexdigest()
-                    chunks.append({
-                        'text': chunk_text,
-                        'chunk_id': chunk_id,
-                        'length': len(chunk_text)
-                    })
-                
-                # Start new chunk with the heading
-                current_chunk = [heading]
-                current_length = len(heading)
+            if is_heading and assembler.parts:
+                # A chunk opened by a heading is measured without a trailing
+                # separator here, which keeps the previous packer's chunk
+                # boundaries
+                sep_length = 0 if assembler.opened_by_heading else para_sep_length
+                if not assembler.fits(paragraph_length, sep_length):
+                    assembler.emit()
+                    assembler.keep_overlap()
+                # The remaining overlap is finalized on its own
+                assembler.emit()
+                assembler.reset()
+                assembler.opened_by_heading = True
+            
+            for i, (piece, piece_length) in enumerate(pieces):
+                # Sentences of one paragraph are joined by spaces
+                sep = sent_sep if i else para_sep
+                # If adding this piece would exceed chunk size, finalize current
+                # chunk and start the next with as much overlap as still fits
+                if not assembler.fits(piece_length, len(sep)):
+                    assembler.emit()
+                    assembler.keep_overlap(piece_length, len(sep))
+                assembler.add(encode(piece), piece_length, sep)
         
         # Add the last chunk if not empty
-        if current_chunk:
-            chunk_text = '\n\n'.join(current_chunk)
-            chunk_id = hashlib.md5(chunk_text.encode()).hexdigest()
-            chunks.append({
-                'text': chunk_text,
-                'chunk_id': chunk_id,
-                'length': len(chunk_text)
-            })
-        
-        # Post-process to ensure no chunk is too large
-        final_chunks = []
-        for chunk in chunks:
-            if chunk['length'] <= self.chunk_size:
-                final_chunks.append(chunk)
-            else:
-                # If a chunk is still too large, split by sentences
-                sentences = re.split(r'(?<=[.!?])\s+', chunk['text'])
-                current_chunk = []
-                current_length = 0
-                
-                for sentence in sentences:
-                    sentence = sentence.strip()
-                    if not sentence:
-                        continue
-                        
-                    if current_chunk and current_length + len(sentence) > self.chunk_size:
-                        chunk_text = ' '.join(current_chunk)
-                        chunk_id = hashlib.md5(chunk_text.encode()).hexdigest()
-                        final_chunks.append({
-                            'text': chunk_text,
-                            'chunk_id': chunk_id,
-                            'length': len(chunk_text)
-                        })
-                        current_chunk = []
-                        current_length = 0
-                        
-                    current_chunk.append(sentence)
-                    current_length += len(sentence) + 1
-                
-                if current_chunk:
-                    chunk_text = ' '.join(current_chunk)
-                    chunk_id = hashlib.md5(chunk_text.encode()).hexdigest()
-                    final_chunks.append({
-                        'text': chunk_text,
-                        'chunk_id': chunk_id,
-                        'length': len(chunk_text)
-                    })
-        
-        return final_chunks
-    
-    def process_document(self, file_path: Path) -> List[Dict[str, Any]]:
+        if assembler.parts:
+            assembler.emit()
+        
+        return assembler.chunks
+    
+    def process_document(self, file_path: Path) -> List[Chunk]:
         """Process a document file into chunks with metadata.
         
         Args:
@@ -155,16 +354,22 @@ class DocumentProcessor:
             # Load the document
             text = self.load_document(file_path)
             
-            # Split into chunks
-            chunks = self.split_into_chunks(text)
+            # Split into chunks; chunk texts are copies, so a mapped file
+            # can be released straight away
+            try:
+                chunks = self.split_into_chunks(text)
+            finally:
+                if isinstance(text, mmap.mmap):
+                    text.close()
             
-            # Add document metadata
+            # Add document metadata, computed once and shared by every chunk
+            document_id = file_path.stem
+            document_path = str(file_path)
+            document_name = file_path.name
             for chunk in chunks:
-                chunk.update({
-                    'document_id': file_path.stem,
-                    'document_path': str(file_path),
-                    'document_name': file_path.name,
-                })
+                chunk.document_id = document_id
+                chunk.document_path = document_path
+                chunk.document_name = document_name
             
             return chunks
             
@@ -172,29 +377,95 @@ class DocumentProcessor:
             print(f"Error processing {file_path}: {str(e)}")
             return []
     
-    def process_directory(self, directory: Path, file_extensions: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    def process_directory(
+        self,
+        directory: Path,
+        file_extensions: Optional[List[str]] = None,
+        recursive: bool = False
+    ) -> List[Chunk]:
         """Process all documents in a directory.
         
         Args:
             directory: Directory containing documents
             file_extensions: List of file extensions to include (e.g., ['.txt', '.md'])
+            recursive: Whether to include documents in subdirectories
             
         Returns:
             List of all document chunks with metadata
         """
         if file_extensions is None:
             file_extensions = ['.txt', '.md', '.pdf']
+        extensions = {ext.lower() for ext in file_extensions}
+        
+        # Get all files with specified extensions in one directory read
+        # instead of one glob per extension
+        if recursive:
+            files = [
+                path for path in directory.rglob('*')
+                if path.suffix.lower() in extensions and path.is_file()
+            ]
+        else:
+            with os.scandir(directory) as entries:
+                files = [
+                    Path(entry.path)
+                    for entry in entries
+                    if entry.is_file() and Path(entry.name).suffix.lower() in extensions
+                ]
+        
+        return self.process_files(files)
+    
+    def process_files(self, files: List[Path]) -> List[Chunk]:
+        """Process a list of document files.
+        
+        Args:
+            files: Paths of the documents to process
             
+        Returns:
+            List of all document chunks with metadata
+        """
         all_chunks = []
+        # Deduplicate within this call only; the vector store already skips
+        # chunks ingested earlier, and a cleared index must be able to re-ingest
+        seen: Set[str] = set()
         
-        # Get all files with specified extensions
-        files = []
-        for ext in file_extensions:
-            files.extend(directory.glob(f'*{ext}'))
+        # Starting processes costs more than chunking a few small files, so
+        # only large batches are split across them. Fork so workers inherit
+        # the loaded modules without re-importing the caller's __main__
+        # module (spawn would re-run app startup).
+        workers = min(self.workers, len(files))
+        if (
+            workers < 2
+            or 'fork' not in multiprocessing.get_all_start_methods()
+            or sum(os.path.getsize(f) for f in files) < self.pool_min_bytes
+        ):
+            for file_path in tqdm(files, desc="Processing documents"):
+                all_chunks.extend(self._drop_seen(self.process_document(file_path), seen))
+            return all_chunks
         
-        # Process each file
-        for file_path in tqdm(files, desc="Processing documents"):
-            chunks = self.process_document(file_path)
-            all_chunks.extend(chunks)
+        # The pool lives only for this batch, so no idle processes stay
+        # resident between ingests; batching several files per task
+        # amortizes the IPC round trips
+        chunksize = max(1, min(8, len(files) // (workers * 4)))
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('fork'),
+            initializer=_init_worker,
+            initargs=(self.chunk_size, self.chunk_overlap),
+        ) as pool:
+            results = pool.map(_process_in_worker, files, chunksize=chunksize)
+            for chunks in tqdm(results, total=len(files), desc="Processing documents"):
+                # Each worker only saw its own files, so dedup across them here
+                all_chunks.extend(self._drop_seen(chunks, seen))
         
         return all_chunks
+
+# The processor each pool worker chunks with, created once per process
+_worker_processor: Optional[DocumentProcessor] = None
+
+def _init_worker(chunk_size: int, chunk_overlap: int) -> None:
+    global _worker_processor
+    _worker_processor = DocumentProcessor(chunk_size, chunk_overlap, dedup=False)
+
+def _process_in_worker(file_path: Path) -> List[Chunk]:
+    assert _worker_processor is not None
+    return _worker_processor.process_document(file_path)
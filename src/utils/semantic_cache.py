@@ -0,0 +1,142 @@
+import os
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Optional
+
+import numpy as np
+import faiss
+
+class SemanticCache:
+    """Similarity-keyed cache backed by a small FAISS inner-product index.
+
+    Keys are embedding vectors; a lookup hits when the cosine similarity
+    between the query vector and a cached key is at least ``threshold``.
+    Entries are evicted oldest-first once ``max_size`` is exceeded. When a
+    ``path`` is given the cache is loaded from disk on start-up and written
+    back every ``save_every`` inserts and on ``save()``.
+    """
+
+    def __init__(
+        self,
+        vector_dim: int,
+        threshold: float,
+        max_size: int = 4096,
+        path: Optional[str] = None,
+        save_every: int = 20
+    ):
+        """Initialize the cache.
+
+        Args:
+            vector_dim: Dimension of the key vectors
+            threshold: Minimum cosine similarity for a lookup to count as a hit
+            max_size: Maximum number of entries kept before evicting the oldest
+            path: Optional FAISS index path to persist the cache to; payloads
+                are stored alongside it in ``{path}.json``
+            save_every: Number of inserts between automatic saves
+        """
+        self.vector_dim = vector_dim
+        self.threshold = threshold
+        self.max_size = max_size
+        self.path = path
+        self.save_every = save_every
+        self._lock = threading.Lock()
+        self._reset()
+        if self.path and os.path.exists(self.path):
+            self._load()
+
+    def _reset(self) -> None:
+        """Start with an empty index."""
+        # IndexIDMap2 keeps ids stable across evictions, so payloads can be
+        # keyed by id rather than by position in the index.
+        self.index = faiss.IndexIDMap2(faiss.IndexFlatIP(self.vector_dim))
+        self.payloads = OrderedDict()
+        self._next_id = 0
+        self._unsaved = 0
+
+    def _load(self) -> None:
+        """Load the index and payloads from disk."""
+        try:
+            index = faiss.read_index(self.path)
+            with open(f"{self.path}.json", 'r') as f:
+                state = json.load(f)
+            if index.ntotal != len(state["ids"]):
+                raise ValueError("cache index and payloads are out of sync")
+            self.index = index
+            self.payloads = OrderedDict(zip(state["ids"], state["payloads"]))
+            self._next_id = state["next_id"]
+            print(f"Loaded cache with {len(self.payloads)} entries from {self.path}")
+        except Exception as e:
+            print(f"Error loading cache: {e}")
+            self._reset()
+
+    def _save_locked(self) -> None:
+        """Write the cache to disk; the caller must hold the lock."""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        # Write to temporary files and swap them in, so concurrent workers
+        # sharing the path never read a half-written cache.
+        faiss.write_index(self.index, f"{self.path}.tmp")
+        with open(f"{self.path}.json.tmp", 'w') as f:
+            json.dump({
+                "next_id": self._next_id,
+                "ids": list(self.payloads.keys()),
+                "payloads": list(self.payloads.values())
+            }, f)
+        os.replace(f"{self.path}.tmp", self.path)
+        os.replace(f"{self.path}.json.tmp", f"{self.path}.json")
+        self._unsaved = 0
+
+    def _normalize(self, vector) -> np.ndarray:
+        """Return a normalized (1, d) float32 copy of the vector."""
+        key = np.array(vector, dtype=np.float32).reshape(1, -1)
+        faiss.normalize_L2(key)
+        return key
+
+    def lookup(self, vector) -> Optional[Any]:
+        """Return the payload of the closest cached key, or None on a miss."""
+        key = self._normalize(vector)
+        with self._lock:
+            if self.index.ntotal == 0:
+                return None
+            scores, ids = self.index.search(key, 1)
+            if ids[0][0] < 0 or scores[0][0] < self.threshold:
+                return None
+            return self.payloads.get(int(ids[0][0]))
+
+    def add(self, vector, payload: Any) -> None:
+        """Cache a payload under the given key vector.
+
+        Payloads must be JSON-serializable when the cache is persisted.
+        """
+        key = self._normalize(vector)
+        with self._lock:
+            if len(self.payloads) >= self.max_size:
+                oldest_id, _ = self.payloads.popitem(last=False)
+                self.index.remove_ids(np.array([oldest_id], dtype=np.int64))
+            entry_id = self._next_id
+            self._next_id += 1
+            self.index.add_with_ids(key, np.array([entry_id], dtype=np.int64))
+            self.payloads[entry_id] = payload
+            self._unsaved += 1
+            if self.path and self._unsaved >= self.save_every:
+                self._save_locked()
+
+    def save(self) -> None:
+        """Persist the cache if it has unsaved entries."""
+        if not self.path:
+            return
+        with self._lock:
+            if self._unsaved:
+                self._save_locked()
+
+    def clear(self) -> None:
+        """Drop all cached entries, including any persisted copy."""
+        with self._lock:
+            self._reset()
+            if self.path:
+                for path in (self.path, f"{self.path}.json"):
+                    if os.path.exists(path):
+                        os.remove(path)
+
+    def __len__(self) -> int:
+        return self.index.ntotal
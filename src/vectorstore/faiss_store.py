@@ -1,132 +1,459 @@
 import os
+import sys
+import threading
 import numpy as np
 import faiss
 from pathlib import Path
-from typing import List, Dict, Any, Optional, Tuple
-import json
+from typing import List, Dict, Any, Optional, Tuple, Union
+import orjson
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Metadata keys stored as their own columns; any other keys go in a
+# per-row dict that is only allocated when a row has them
+_COLUMNS = ('chunk_id', 'length', 'document_id', 'document_path', 'document_name')
+# Document fields repeat for every chunk of a document, so the strings are
+# interned and each row holds a reference to one shared copy
+_INTERNED = frozenset(('document_id', 'document_path', 'document_name'))
 
 class FAISSStore:
-    def __init__(self, vector_dim: int, index_path: str):
-        """Initialize the FAISS vector store."""
+    # Rows appended to the metadata log are folded into a fresh Parquet
+    # snapshot once they outnumber both the snapshot and this many rows
+    LOG_COMPACT_ROWS = 1024
+    # k-means needs about this many training vectors per centroid; FAISS
+    # warns below it, and IVF recall drops sharply
+    TRAIN_POINTS_PER_CENTROID = 39
+    # "sq8" fixes each dimension's value range from its training batch and
+    # clips later vectors to it, so the batch must be large enough to span it
+    SQ8_MIN_TRAIN = 512
+    
+    def __init__(
+        self,
+        vector_dim: int,
+        index_path: str,
+        index_type: str = "flat",
+        mmap: bool = False,
+        hnsw_m: int = 32,
+        hnsw_ef_search: int = 64,
+        ivf_nlist: int = 256,
+        ivf_nprobe: int = 16,
+        pq_m: int = 64,
+        omp_threads: Optional[int] = None
+    ):
+        """Initialize the FAISS vector store.
+        
+        Args:
+            vector_dim: Dimension of the stored vectors
+            index_path: Path the index is loaded from and saved to
+            index_type: "flat" for exact fp32 vectors, "fp16" to store half-precision
+                vectors (2x smaller, no training), "sq8" to store 8-bit
+                scalar-quantized codes (4x smaller, trained on the first batch),
+                "hnsw" for an approximate HNSW graph over fp32 vectors, or "ivfpq"
+                for an inverted file of product-quantized codes (trained on the
+                first batch, which needs at least max(ivf_nlist, 256) vectors)
+            mmap: Memory-map the saved index read-only instead of reading it into
+                private memory, so worker processes share it through the page cache
+            hnsw_m: Graph neighbours per node for "hnsw"
+            hnsw_ef_search: Candidate list size when searching "hnsw"
+            ivf_nlist: Number of inverted lists (coarse clusters) for "ivfpq"
+            ivf_nprobe: Inverted lists scanned per query for "ivfpq"
+            pq_m: Sub-quantizers per vector for "ivfpq"; must divide vector_dim
+            omp_threads: OpenMP threads FAISS may use per search; None keeps
+                the FAISS default of one per core
+        """
         self.vector_dim = vector_dim
         self.index_path = index_path
+        self.index_type = index_type
+        self.mmap = mmap
+        self.hnsw_m = hnsw_m
+        self.hnsw_ef_search = hnsw_ef_search
+        self.ivf_nlist = ivf_nlist
+        self.ivf_nprobe = ivf_nprobe
+        self.pq_m = pq_m
+        if omp_threads:
+            faiss.omp_set_num_threads(omp_threads)
+        self._read_only = False
+        # Why the loaded index can't take new vectors, if it was written by an
+        # older version; cleared once the index is cleared
+        self._legacy: Optional[str] = None
         self.index = None
-        self.metadata = []
+        # Guards the index and metadata against concurrent add, search and swap
+        self._lock = threading.Lock()
+        self._reset_metadata()
         self._initialize_index()
     
+    def _reset_metadata(self):
+        """Start with empty metadata columns."""
+        # Row i of every column describes vector i in the index
+        self.texts = []
+        self.columns = {key: [] for key in _COLUMNS}
+        self.extras = []
+        self._chunk_ids = set()  # Content hashes of every indexed chunk
+        # Rows in the Parquet snapshot, and rows on disk including the log;
+        # a zero snapshot count makes the next save write a full snapshot
+        self._snapshot_count = 0
+        self._persisted_count = 0
+    
+    def _append_row(self, text: str, metadata: Dict[str, Any]):
+        """Append one vector's text and metadata to the columns."""
+        self.texts.append(text)
+        for key in _COLUMNS:
+            value = metadata.get(key)
+            if key in _INTERNED and isinstance(value, str):
+                value = sys.intern(value)
+            self.columns[key].append(value)
+        extra = {k: v for k, v in metadata.items() if k not in _COLUMNS and k != 'text'}
+        self.extras.append(extra or None)
+        chunk_id = metadata.get('chunk_id')
+        if chunk_id is not None:
+            self._chunk_ids.add(chunk_id)
+    
+    def _materialize(self, idx: int) -> Dict[str, Any]:
+        """Build the metadata dict for a single row."""
+        row = {'text': self.texts[idx]}
+        for key, column in self.columns.items():
+            value = column[idx]
+            if value is not None:
+                row[key] = value
+        extra = self.extras[idx]
+        if extra:
+            row.update(extra)
+        return row
+    
     def _initialize_index(self):
         """Initialize or load the FAISS index."""
         if os.path.exists(self.index_path):
             self._load_index()
         else:
             # Create a new FAISS index
-            self.index = faiss.IndexFlatL2(self.vector_dim)
+            self.index = self._create_index()
+    
+    def _create_index(self):
+        """Create an empty FAISS index of the configured type.
+        
+        Vectors are unit-length, so inner product equals cosine similarity
+        and higher scores mean closer matches.
+        """
+        if self.index_type == "flat":
+            return faiss.IndexFlatIP(self.vector_dim)
+        if self.index_type == "fp16":
+            return faiss.IndexScalarQuantizer(
+                self.vector_dim, faiss.ScalarQuantizer.QT_fp16, faiss.METRIC_INNER_PRODUCT
+            )
+        if self.index_type == "sq8":
+            return faiss.IndexScalarQuantizer(
+                self.vector_dim, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_INNER_PRODUCT
+            )
+        if self.index_type == "hnsw":
+            index = faiss.IndexHNSWFlat(self.vector_dim, self.hnsw_m, faiss.METRIC_INNER_PRODUCT)
+            self._configure_search(index)
+            return index
+        if self.index_type == "ivfpq":
+            quantizer = faiss.IndexFlatIP(self.vector_dim)
+            index = faiss.IndexIVFPQ(
+                quantizer, self.vector_dim, self.ivf_nlist, self.pq_m, 8,
+                faiss.METRIC_INNER_PRODUCT
+            )
+            self._configure_search(index)
+            return index
+        raise ValueError(f"Unknown index type: {self.index_type}")
+    
+    def _min_train_vectors(self) -> int:
+        """Smallest first batch the configured index type can be trained on."""
+        if self.index_type == "ivfpq":
+            # Both the coarse clusters and the 256 codes per PQ sub-quantizer
+            # are learned with k-means
+            return self.TRAIN_POINTS_PER_CENTROID * max(self.ivf_nlist, 256)
+        if self.index_type == "sq8":
+            return self.SQ8_MIN_TRAIN
+        return 1
+    
+    def _configure_search(self, index):
+        """Apply the configured search-time parameters to an approximate index."""
+        if isinstance(index, faiss.IndexHNSW):
+            index.hnsw.efSearch = self.hnsw_ef_search
+        elif isinstance(index, faiss.IndexIVF):
+            index.nprobe = self.ivf_nprobe
     
     def _load_index(self):
         """Load index and metadata from disk."""
         try:
             # Load the FAISS index
-            self.index = faiss.read_index(self.index_path)
+            if self.mmap:
+                self.index = faiss.read_index(
+                    self.index_path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+                )
+                self._read_only = True
+            else:
+                self.index = faiss.read_index(self.index_path)
+            self._configure_search(self.index)
             
-            # Load metadata
+            # Load metadata, falling back to the JSON written by older versions
+            parquet_path = f"{self.index_path}.parquet"
             metadata_path = f"{self.index_path}.json"
-            if os.path.exists(metadata_path):
-                with open(metadata_path, 'r') as f:
-                    self.metadata = json.load(f)
+            if os.path.exists(parquet_path):
+                self._load_parquet(parquet_path)
+                self._snapshot_count = self._persisted_count = len(self.texts)
+                if os.path.exists(f"{self.index_path}.jsonl"):
+                    self._replay_log(f"{self.index_path}.jsonl")
+            elif os.path.exists(metadata_path):
+                # Only versions that fingerprinted chunks with MD5 wrote JSON,
+                # so has_chunk can't recognise these chunks when re-ingested
+                self._legacy = "its chunk ids predate XXH3 fingerprints"
+                with open(metadata_path, 'rb') as f:
+                    for metadata in orjson.loads(f.read()):
+                        metadata.pop('index', None)  # Written by older versions
+                        self._append_row(metadata.get('text', ''), metadata)
             
-            print(f"Loaded index with {len(self.metadata)} vectors")
+            print(f"Loaded index with {len(self.texts)} vectors")
+            if self.index.metric_type != faiss.METRIC_INNER_PRODUCT:
+                self._legacy = "it was built with L2 distance on unnormalized vectors"
+            if self._legacy:
+                print(f"Warning: loaded index is read-only because {self._legacy}; clear and re-ingest")
             
         except Exception as e:
             print(f"Error loading index: {e}")
             # If loading fails, create a new index
-            self.index = faiss.IndexFlatL2(self.vector_dim)
-            self.metadata = []
+            self.index = self._create_index()
+            self._read_only = False
+            self._legacy = None
+            self._reset_metadata()
+    
+    def _load_parquet(self, parquet_path: str):
+        """Load the metadata columns from a Parquet file."""
+        table = pq.read_table(parquet_path)
+        self.texts = table.column('text').to_pylist()
+        for key in _COLUMNS:
+            values = table.column(key).to_pylist()
+            if key in _INTERNED:
+                values = [sys.intern(v) if v is not None else None for v in values]
+            self.columns[key] = values
+        self.extras = [
+            orjson.loads(extra) if extra is not None else None
+            for extra in table.column('extras').to_pylist()
+        ]
+        self._chunk_ids = {c for c in self.columns['chunk_id'] if c is not None}
+    
+    def _replay_log(self, log_path: str):
+        """Append the rows saved to the metadata log since the last snapshot."""
+        with open(log_path, 'rb') as f:
+            lines = f.read().splitlines()
+        for line in lines:
+            try:
+                row, metadata = orjson.loads(line)
+            except orjson.JSONDecodeError:
+                # A save was interrupted mid-write; rewrite everything next time
+                self._snapshot_count = 0
+                break
+            if row < len(self.texts):
+                continue  # Already in the snapshot
+            if row > len(self.texts):
+                self._snapshot_count = 0
+                break
+            self._append_row(metadata.pop('text', ''), metadata)
+        self._persisted_count = len(self.texts)
+    
+    def _save_parquet(self, parquet_path: str):
+        """Write the metadata columns to a Parquet file."""
+        table = pa.table({
+            'text': pa.array(self.texts, type=pa.string()),
+            'chunk_id': pa.array(self.columns['chunk_id'], type=pa.string()),
+            'length': pa.array(self.columns['length'], type=pa.int64()),
+            'document_id': pa.array(self.columns['document_id'], type=pa.string()),
+            'document_path': pa.array(self.columns['document_path'], type=pa.string()),
+            'document_name': pa.array(self.columns['document_name'], type=pa.string()),
+            # Rare free-form keys are kept as JSON text
+            'extras': pa.array(
+                [orjson.dumps(extra).decode() if extra else None for extra in self.extras],
+                type=pa.string()
+            ),
+        })
+        # Repeated document fields are dictionary-encoded by the Parquet writer
+        pq.write_table(table, f"{parquet_path}.tmp", compression='zstd')
+        os.replace(f"{parquet_path}.tmp", parquet_path)
+    
+    def _ensure_writable(self):
+        """Swap a memory-mapped read-only index for an in-memory copy before writing.
+        
+        Raises:
+            RuntimeError: If the index was written by an older version, or the
+                index and the metadata rows are out of sync
+        """
+        if self._legacy:
+            raise RuntimeError(
+                f"Cannot add to the existing index because {self._legacy}; "
+                "clear the index and re-ingest all documents"
+            )
+        if self.index.ntotal != len(self.texts):
+            raise RuntimeError(
+                f"Index has {self.index.ntotal} vectors but {len(self.texts)} metadata rows; "
+                "clear and re-ingest before adding documents"
+            )
+        if self._read_only:
+            # Copy the mapped index rather than re-reading the file, which
+            # another process may have replaced since it was loaded
+            self.index = faiss.clone_index(self.index)
+            self._configure_search(self.index)
+            self._read_only = False
     
     def save(self):
         """Save the index and metadata to disk."""
-        if self.index is None:
-            return
+        with self._lock:
+            if self.index is None:
+                return
             
-        # Ensure directory exists
-        os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+            # Ensure directory exists
+            os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
         
-        # Save FAISS index
-        faiss.write_index(self.index, self.index_path)
+            # Save FAISS index; a memory-mapped index is unchanged since loading.
+            # Write to a temporary file and swap it in so processes that have the
+            # old file mapped keep reading a consistent copy.
+            if self.index.ntotal != len(self.texts):
+                raise RuntimeError(
+                    f"Refusing to save: index has {self.index.ntotal} vectors "
+                    f"but {len(self.texts)} metadata rows"
+                )
+            if not self._read_only:
+                faiss.write_index(self.index, f"{self.index_path}.tmp")
+                os.replace(f"{self.index_path}.tmp", self.index_path)
         
-        # Save metadata
-        metadata_path = f"{self.index_path}.json"
-        with open(metadata_path, 'w') as f:
-            json.dump(self.metadata, f)
+            # Save metadata: new rows are appended to a log, so saving after an
+            # incremental ingest costs O(new rows) rather than a full rewrite
+            parquet_path = f"{self.index_path}.parquet"
+            log_path = f"{self.index_path}.jsonl"
+            total = len(self.texts)
+            log_rows = total - self._snapshot_count
+            if (
+                self._snapshot_count == 0
+                or not os.path.exists(parquet_path)
+                or log_rows > max(self._snapshot_count, self.LOG_COMPACT_ROWS)
+            ):
+                self._save_parquet(parquet_path)
+                if os.path.exists(log_path):
+                    os.remove(log_path)
+                self._snapshot_count = self._persisted_count = total
+            elif total > self._persisted_count:
+                with open(log_path, 'ab') as f:
+                    f.write(b''.join(
+                        orjson.dumps([i, self._materialize(i)]) + b'\n'
+                        for i in range(self._persisted_count, total)
+                    ))
+                self._persisted_count = total
     
     def add_embeddings(
         self, 
         texts: List[str], 
-        embeddings: List[List[float]], 
+        embeddings: Union[np.ndarray, List[List[float]]], 
         metadatas: Optional[List[Dict[str, Any]]] = None
     ) -> None:
-        """Add embeddings to the index with associated metadata."""
-        if not texts or not embeddings:
+        """Add embeddings to the index with associated metadata.
+        
+        Args:
+            texts: Texts the embeddings were computed from
+            embeddings: Array of shape (len(texts), vector_dim), or the
+                equivalent nested lists; float32 C-contiguous arrays are used as-is
+            metadatas: Optional metadata dict per text
+        """
+        if not texts or len(embeddings) == 0:
             return
+        
+        # No copy when the embedder already produced a float32 C-contiguous array
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
             
         if metadatas is None:
             metadatas = [{} for _ in range(len(texts))]
-            
-        # Convert embeddings to numpy array
-        embeddings_np = np.array(embeddings).astype('float32')
         
-        # Add to FAISS index
-        if self.index.ntotal == 0:
-            # First batch - use the embeddings directly
-            self.index.add(embeddings_np)
-        else:
-            # Subsequent batches - check dimension compatibility
-            if embeddings_np.shape[1] != self.vector_dim:
-                raise ValueError(
-                    f"Dimensionality mismatch: "
-                    f"expected {self.vector_dim}, got {embeddings_np.shape[1]}"
-                )
-            self.index.add(embeddings_np)
+        with self._lock:
+            self._ensure_writable()
+            
+            # Add to FAISS index
+            if self.index.ntotal == 0:
+                # First batch - quantized indexes learn their value ranges
+                # (and IVF its clusters) from it
+                if not self.index.is_trained:
+                    min_train = self._min_train_vectors()
+                    if len(embeddings) < min_train:
+                        raise ValueError(
+                            f"The first batch for an {self.index_type} index needs at least "
+                            f"{min_train} vectors to train, got {len(embeddings)}"
+                        )
+                    self.index.train(embeddings)
+                self.index.add(embeddings)
+            else:
+                # Subsequent batches - check dimension compatibility
+                if embeddings.ndim != 2 or embeddings.shape[1] != self.vector_dim:
+                    raise ValueError(
+                        f"Dimensionality mismatch: "
+                        f"expected {self.vector_dim}, got {embeddings.shape[-1]}"
+                    )
+                self.index.add(embeddings)
         
-        # Add metadata
-        for i, (text, metadata) in enumerate(zip(texts, metadatas)):
-            self.metadata.append({
-                'text': text,
-                'index': self.index.ntotal - len(texts) + i,
-                **metadata
-            })
+            # Add metadata; a row's position is its index id
+            for text, metadata in zip(texts, metadatas):
+                self._append_row(text, metadata)
+    
+    def has_chunk(self, chunk_id: str) -> bool:
+        """Check whether a chunk with this content hash is already indexed."""
+        return chunk_id in self._chunk_ids
     
     def similarity_search(
         self, 
-        query_embedding: List[float], 
+        query_embedding: Union[np.ndarray, List[float]], 
         k: int = 5
     ) -> List[Dict[str, Any]]:
         """Find the k most similar documents to the query embedding."""
-        if self.index is None or self.index.ntotal == 0:
-            return []
+        return self.similarity_search_batch(
+            np.asarray(query_embedding, dtype=np.float32).reshape(1, -1), k
+        )[0]
+    
+    def similarity_search_batch(
+        self, 
+        query_embeddings: Union[np.ndarray, List[List[float]]], 
+        k: int = 5
+    ) -> List[List[Dict[str, Any]]]:
+        """Find the k most similar documents for each of several queries.
+        
+        All queries go to FAISS in a single search call, which spreads them
+        across its OpenMP threads.
         
-        # Convert query to numpy array
-        query_np = np.array([query_embedding]).astype('float32')
+        Args:
+            query_embeddings: Array of shape (n_queries, vector_dim)
+            k: Number of results per query
+            
+        Returns:
+            One result list per query, in query order
+        """
+        # Copy the queries into a float32 array and make them unit-length so
+        # scores are cosine similarities; the copy keeps cached embeddings intact
+        queries = np.array(query_embeddings, dtype=np.float32, order='C', ndmin=2)
+        with self._lock:
+            if self.index is None or self.index.ntotal == 0:
+                return [[] for _ in range(len(queries))]
+            faiss.normalize_L2(queries)
         
-        # Search the index
-        distances, indices = self.index.search(query_np, k)
+            # Search the index
+            distances, indices = self.index.search(queries, k)
         
-        # Get the metadata for the top results
-        results = []
-        for i, (idx, distance) in enumerate(zip(indices[0], distances[0])):
-            if idx < 0 or idx >= len(self.metadata):
-                continue
+            # Build metadata dicts only for the top results
+            results = []
+            for row_indices, row_distances in zip(indices, distances):
+                row = []
+                for idx, distance in zip(row_indices, row_distances):
+                    if idx < 0 or idx >= len(self.texts):
+                        continue
                 
-            result = self.metadata[idx].copy()
-            result['score'] = float(distance)
-            results.append(result)
+                    result = self._materialize(idx)
+                    result['score'] = float(distance)
+                    row.append(result)
+                results.append(row)
         
-        return results
+            return results
     
     def get_document(self, doc_id: int) -> Optional[Dict[str, Any]]:
         """Get a document by its ID."""
-        if doc_id < 0 or doc_id >= len(self.metadata):
+        if doc_id < 0 or doc_id >= len(self.texts):
             return None
-        return self.metadata[doc_id]
+        return self._materialize(doc_id)
     
     def get_documents(self, doc_ids: List[int]) -> List[Dict[str, Any]]:
         """Get multiple documents by their IDs."""
@@ -134,9 +461,12 @@ class FAISSStore:
     
     def get_all_documents(self) -> List[Dict[str, Any]]:
         """Get all documents in the index."""
-        return self.metadata.copy()
+        return [self._materialize(i) for i in range(len(self.texts))]
     
     def clear(self) -> None:
         """Clear the index and all metadata."""
-        self.index = faiss.IndexFlatL2(self.vector_dim)
-        self.metadata = []
+        with self._lock:
+            self.index = self._create_index()
+            self._read_only = False
+            self._legacy = None
+            self._reset_metadata()
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# Make `src` and `config` importable when running `pytest tests/` from the project root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
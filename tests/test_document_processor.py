@@ -0,0 +1,184 @@
+import mmap
+import random
+import re
+from pathlib import Path
+from typing import List, Optional, Sequence
+
+import pytest
+import xxhash
+
+from src.utils.document_processor import DocumentProcessor
+
+SAMPLE_DOCUMENT = Path(__file__).resolve().parent.parent / "data" / "documents" / "hr-policies.txt"
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?])\s+')
+
+
+def reference_chunks(text: str, chunk_size: int) -> Optional[List[str]]:
+    """Chunk texts from the paragraph packer used before chunk_size was enforced inline.
+
+    Returns None when that packer produced a chunk over chunk_size, which
+    it then re-split in a post-processing pass that is no longer used.
+    """
+    paragraphs = [p.strip() for p in text.split('\n\n') if p.strip()]
+    chunks = []
+    current_chunk = []
+    current_length = 0
+    for paragraph in paragraphs:
+        is_heading = paragraph.endswith(':') or (len(paragraph) < 100 and paragraph.isupper())
+        if current_chunk and current_length + len(paragraph) > chunk_size:
+            chunks.append('\n\n'.join(current_chunk))
+            current_chunk = current_chunk[-min(2, len(current_chunk)):]
+            current_length = sum(len(p) + 2 for p in current_chunk)
+        current_chunk.append(paragraph)
+        current_length += len(paragraph) + 2
+        if is_heading and len(current_chunk) > 1:
+            heading = current_chunk.pop()
+            if current_chunk:
+                chunks.append('\n\n'.join(current_chunk))
+            current_chunk = [heading]
+            current_length = len(heading)
+    if current_chunk:
+        chunks.append('\n\n'.join(current_chunk))
+    if any(len(chunk) > chunk_size for chunk in chunks):
+        return None
+    return chunks
+
+
+def sample_texts(
+    count: int = 300,
+    ascii_only: bool = False,
+    paragraph_words: Sequence[int] = (3, 10, 40, 150, 400)
+) -> List[str]:
+    """Random documents mixing short and long paragraphs, headings and separators."""
+    rng = random.Random(0)
+    words = "alpha beta gamma delta. epsilon! zeta? eta theta iota kappa lambda mu.".split()
+    if not ascii_only:
+        words += "café naïve. résumé! 日本語。".split()
+    texts = []
+    for _ in range(count):
+        paragraphs = []
+        for _ in range(rng.randint(0, 30)):
+            paragraph = " ".join(rng.choice(words) for _ in range(rng.choice(paragraph_words)))
+            roll = rng.random()
+            if roll < 0.1:
+                paragraph = paragraph.upper()[:80]
+            elif roll < 0.2:
+                paragraph = paragraph[:50] + ":"
+            paragraphs.append(paragraph)
+        texts.append("".join(p + rng.choice(["\n\n", "\n\n\n", "\n\n  \n\n"]) for p in paragraphs))
+    return texts
+
+
+@pytest.mark.parametrize("chunk_size, paragraph_words", [
+    (200, (3, 10, 20)),
+    (1000, (3, 10, 40, 150)),
+    (1000, (3, 10, 40, 150, 400)),
+])
+def test_matches_reference_when_no_chunk_was_oversized(chunk_size, paragraph_words):
+    processor = DocumentProcessor(chunk_size=chunk_size)
+    compared = 0
+    for text in [SAMPLE_DOCUMENT.read_text()] + sample_texts(paragraph_words=paragraph_words):
+        expected = reference_chunks(text, chunk_size)
+        if expected is None:
+            continue
+        assert [chunk.text for chunk in processor.split_into_chunks(text)] == expected
+        compared += 1
+    assert compared >= 30
+
+
+@pytest.mark.parametrize("chunk_size", [40, 200, 1000])
+def test_only_unsplittable_sentences_exceed_chunk_size(chunk_size):
+    processor = DocumentProcessor(chunk_size=chunk_size)
+    for text in sample_texts(100):
+        for chunk in processor.split_into_chunks(text):
+            assert chunk.length == len(chunk.text)
+            if chunk.length > chunk_size:
+                assert '\n\n' not in chunk.text
+                assert len(SENTENCE_BOUNDARY.split(chunk.text)) == 1
+
+
+def test_chunk_ids_are_xxh3_fingerprints_of_the_text():
+    processor = DocumentProcessor(chunk_size=200)
+    for text in sample_texts(50):
+        for chunk in processor.split_into_chunks(text):
+            assert chunk.chunk_id == xxhash.xxh3_128_hexdigest(chunk.text.encode('utf-8'))
+
+
+def test_load_document_normalizes_newlines(tmp_path):
+    path = tmp_path / "windows.txt"
+    path.write_bytes(b"First paragraph.\r\n\r\nSecond paragraph.\r\n")
+    assert DocumentProcessor().load_document(path) == b"First paragraph.\n\nSecond paragraph.\n"
+
+
+def test_split_into_chunks_is_repeatable():
+    processor = DocumentProcessor(chunk_size=200)
+    text = SAMPLE_DOCUMENT.read_text()
+    first = processor.split_into_chunks(text)
+    assert first
+    assert [c.chunk_id for c in processor.split_into_chunks(text)] == [c.chunk_id for c in first]
+
+
+def test_process_files_drops_chunks_repeated_across_files(tmp_path):
+    original = tmp_path / "policies.txt"
+    original.write_bytes(SAMPLE_DOCUMENT.read_bytes())
+    copy = tmp_path / "policies-copy.txt"
+    copy.write_bytes(SAMPLE_DOCUMENT.read_bytes())
+    processor = DocumentProcessor(chunk_size=300)
+    single = [chunk.chunk_id for chunk in processor.process_files([original])]
+    assert [chunk.chunk_id for chunk in processor.process_files([original, copy])] == single
+    # Each call deduplicates independently
+    assert [chunk.chunk_id for chunk in processor.process_files([original, copy])] == single
+    undeduplicated = DocumentProcessor(chunk_size=300, dedup=False).process_files([original, copy])
+    assert [chunk.chunk_id for chunk in undeduplicated] == single + single
+
+
+def _summary(chunks):
+    return [(chunk.text, chunk.chunk_id, chunk.length) for chunk in chunks]
+
+
+def ascii_texts() -> List[str]:
+    return [text for text in sample_texts(60, ascii_only=True) if text] + [SAMPLE_DOCUMENT.read_text()]
+
+
+@pytest.mark.parametrize("chunk_size", [40, 200, 1000])
+def test_str_and_bytes_inputs_agree(chunk_size):
+    processor = DocumentProcessor(chunk_size=chunk_size)
+    for text in ascii_texts():
+        expected = _summary(processor.split_into_chunks(text))
+        assert _summary(processor.split_into_chunks(text.encode('utf-8'))) == expected
+
+
+@pytest.mark.parametrize("chunk_size", [40, 200, 1000])
+def test_str_and_mmap_inputs_agree(tmp_path, chunk_size):
+    processor = DocumentProcessor(chunk_size=chunk_size)
+    path = tmp_path / "doc.txt"
+    for text in ascii_texts():
+        expected = _summary(processor.split_into_chunks(text))
+        path.write_bytes(text.encode('utf-8'))
+        with open(path, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            assert _summary(processor.split_into_chunks(mapped)) == expected
+        finally:
+            mapped.close()
+
+
+def test_process_document_reads_large_files_through_mmap(tmp_path, monkeypatch):
+    path = tmp_path / "policies.txt"
+    path.write_bytes(SAMPLE_DOCUMENT.read_bytes())
+    processor = DocumentProcessor(chunk_size=300)
+    expected = _summary(processor.process_document(path))
+    monkeypatch.setattr(DocumentProcessor, "MMAP_THRESHOLD", 1)
+    assert isinstance(processor.load_document(path), mmap.mmap)
+    assert _summary(processor.process_document(path)) == expected
+
+
+def test_worker_processes_give_the_same_chunks(tmp_path):
+    files = []
+    for i, text in enumerate(sample_texts(12)):
+        path = tmp_path / f"doc{i}.txt"
+        path.write_text(text + "\n\nShared footer.")
+        files.append(path)
+    expected = _summary(DocumentProcessor(chunk_size=300).process_files(files))
+    parallel = DocumentProcessor(chunk_size=300, workers=3, pool_min_bytes=1).process_files(files)
+    assert _summary(parallel) == expected
@@ -0,0 +1,122 @@
+import os
+
+import numpy as np
+import pytest
+
+from src.vectorstore.faiss_store import FAISSStore
+
+DIM = 8
+
+
+def make_store(tmp_path, **kwargs):
+    return FAISSStore(vector_dim=DIM, index_path=str(tmp_path / "store.faiss"), **kwargs)
+
+
+def add_rows(store, start, count):
+    rng = np.random.default_rng(start)
+    embeddings = rng.random((count, DIM), dtype=np.float32)
+    texts = [f"text {i}" for i in range(start, start + count)]
+    metadatas = [
+        {'chunk_id': f"id-{i}", 'document_name': "doc.txt", 'length': len(text), 'page': i}
+        for i, text in zip(range(start, start + count), texts)
+    ]
+    store.add_embeddings(texts, embeddings, metadatas)
+
+
+def test_incremental_saves_append_to_the_log(tmp_path):
+    store = make_store(tmp_path)
+    add_rows(store, 0, 3)
+    store.save()
+    log_path = tmp_path / "store.faiss.jsonl"
+    assert not log_path.exists()
+
+    add_rows(store, 3, 2)
+    store.save()
+    assert len(log_path.read_bytes().splitlines()) == 2
+
+    reloaded = make_store(tmp_path)
+    assert reloaded.index.ntotal == 5
+    assert reloaded.get_all_documents() == store.get_all_documents()
+    assert reloaded.get_document(4)['page'] == 4
+    assert reloaded.has_chunk("id-4")
+
+
+def test_replay_stops_at_a_torn_line_and_next_save_compacts(tmp_path):
+    store = make_store(tmp_path)
+    add_rows(store, 0, 3)
+    store.save()
+    add_rows(store, 3, 2)
+    store.save()
+    log_path = tmp_path / "store.faiss.jsonl"
+    # A later save was interrupted part-way through a line
+    with open(log_path, 'ab') as f:
+        f.write(b'[5, {"text": "tor')
+
+    reloaded = make_store(tmp_path)
+    assert reloaded.index.ntotal == 5
+    assert [doc['text'] for doc in reloaded.get_all_documents()] == [f"text {i}" for i in range(5)]
+
+    reloaded.save()
+    assert not log_path.exists()
+    assert make_store(tmp_path).get_all_documents() == store.get_all_documents()
+
+
+def test_log_is_compacted_into_the_snapshot(tmp_path, monkeypatch):
+    monkeypatch.setattr(FAISSStore, "LOG_COMPACT_ROWS", 4)
+    store = make_store(tmp_path)
+    log_path = tmp_path / "store.faiss.jsonl"
+    add_rows(store, 0, 2)
+    store.save()
+    add_rows(store, 2, 3)
+    store.save()
+    assert len(log_path.read_bytes().splitlines()) == 3
+
+    # Five log rows exceed max(snapshot rows, LOG_COMPACT_ROWS)
+    add_rows(store, 5, 2)
+    store.save()
+    assert not log_path.exists()
+
+    reloaded = make_store(tmp_path)
+    assert reloaded.index.ntotal == 7
+    assert reloaded.get_all_documents() == store.get_all_documents()
+
+
+def test_clear_then_save_drops_the_log(tmp_path):
+    store = make_store(tmp_path)
+    add_rows(store, 0, 3)
+    store.save()
+    add_rows(store, 3, 1)
+    store.save()
+    store.clear()
+    add_rows(store, 10, 2)
+    store.save()
+    assert not os.path.exists(tmp_path / "store.faiss.jsonl")
+    assert [doc['text'] for doc in make_store(tmp_path).get_all_documents()] == ["text 10", "text 11"]
+
+
+def test_refuses_to_add_when_vectors_and_metadata_disagree(tmp_path):
+    store = make_store(tmp_path)
+    add_rows(store, 0, 2)
+    store.texts.pop()
+    with pytest.raises(RuntimeError):
+        add_rows(store, 2, 1)
+
+
+def test_ivfpq_needs_enough_vectors_per_centroid_to_train(tmp_path):
+    store = make_store(tmp_path, index_type="ivfpq", ivf_nlist=4, pq_m=4)
+    minimum = FAISSStore.TRAIN_POINTS_PER_CENTROID * 256
+    with pytest.raises(ValueError):
+        add_rows(store, 0, minimum - 1)
+    assert store.index.ntotal == 0
+    add_rows(store, 0, minimum)
+    assert store.index.ntotal == minimum
+
+
+def test_sq8_needs_a_representative_first_batch(tmp_path):
+    store = make_store(tmp_path, index_type="sq8")
+    with pytest.raises(ValueError):
+        add_rows(store, 0, FAISSStore.SQ8_MIN_TRAIN - 1)
+    add_rows(store, 0, FAISSStore.SQ8_MIN_TRAIN)
+    # Later batches of any size are encoded with the trained ranges
+    add_rows(store, FAISSStore.SQ8_MIN_TRAIN, 1)
+    assert store.index.ntotal == FAISSStore.SQ8_MIN_TRAIN + 1